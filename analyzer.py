@@ -0,0 +1,236 @@
+import threading, time, numpy as np, globals as gp
+from scipy.fft import rfft
+from utilities.RingBuffer import RingBuffer
+from rhythm import OnsetDetector
+
+
+class SpectrumKernel:
+    """Windowed real FFT of one block into normalised log magnitudes.
+
+    All intermediate buffers are float32 and allocated once; scipy's rfft has no `out` argument so
+    its complex result is the only array created per block."""
+
+    # phase correlation of the channels, a summed mono frame is always fully correlated
+    correlation = 1.0
+
+    def __init__(self, fft_size: int, window: np.ndarray) -> None:
+        self.fft_size = fft_size
+        self.bins = fft_size // 2 + 1
+        self.window = np.asarray(window, dtype=np.float32)
+        self.frame = np.zeros(fft_size, dtype=np.float32)
+        self.magnitudes = np.zeros(self.bins, dtype=np.float32)
+        rfft(self.frame)  # lets scipy plan and cache this size before the first real block
+
+    def process(self, block: np.ndarray, out: np.ndarray):
+        """block is (frames, channels) PCM with frames <= fft_size, out receives `bins` values"""
+        n = len(block)
+        channels = block.shape[1]
+        frame = self.frame
+        np.sum(block, axis=1, dtype=np.float32, out=frame[:n])
+        frame[n:] = 0
+        frame *= self.window
+        np.abs(rfft(frame, overwrite_x=True), out=self.magnitudes)
+        # forward normalisation and the channel mean folded into one scale
+        self.magnitudes *= 1 / (self.fft_size * channels)
+        self.magnitudes += 1e-6
+        np.log10(self.magnitudes, out=out)
+
+        m = np.max(out)
+        if m < 1e-6:
+            out.fill(0)
+        else:
+            out /= m
+
+
+class StereoKernel(SpectrumKernel):
+    """Both channels of a (frames, 2) block in one batched rfft along the sample axis.
+
+    The interleaved block is windowed straight into a (fft_size, 2) float32 frame, no per channel copy
+    is made. out receives (2, bins) log magnitudes normalised by their joint maximum so the louder
+    side stays louder; `correlation` is the channels' phase correlation, 1 for mono content, 0 for
+    unrelated channels and -1 for channels in antiphase."""
+
+    def __init__(self, fft_size: int, window: np.ndarray) -> None:
+        super().__init__(fft_size, window)
+        self.frame = np.zeros((fft_size, 2), dtype=np.float32)
+        self.magnitudes = np.zeros((self.bins, 2), dtype=np.float32)
+        self.correlation = 1.0
+        rfft(self.frame, axis=0)
+
+    def process(self, block: np.ndarray, out: np.ndarray):
+        n = len(block)
+        frame = self.frame
+        np.multiply(block, self.window[:n, None], out=frame[:n])
+        frame[n:] = 0
+        spectrum = rfft(frame, axis=0, overwrite_x=True)
+        left, right = spectrum[:, 0], spectrum[:, 1]
+        energy = np.sqrt(np.vdot(left, left).real * np.vdot(right, right).real)
+        self.correlation = float(np.vdot(left, right).real / energy) if energy > 1e-9 else 1.0
+
+        np.abs(spectrum, out=self.magnitudes)
+        self.magnitudes *= 1 / self.fft_size
+        self.magnitudes += 1e-6
+        np.log10(self.magnitudes.T, out=out)
+
+        m = np.max(out)
+        if m < 1e-6:
+            out.fill(0)
+        else:
+            out /= m
+
+
+class Analyzer:
+    """Computes spectra on its own thread from the PCM the audio callback pushes into a ring buffer.
+
+    The analysis is a STFT over a sliding history of `fft_size` frames advanced by `hop_size`, so its
+    rate does not depend on the device's frames_per_buffer. With hop_size == fft_size it is the old
+    one spectrum per block.
+
+    Spectra are double buffered: the worker fills the back buffer then flips `front`, so get_amps()
+    can hand out the front buffer without copying.
+
+    With stereo set, two channel tracks keep their channels apart: get_amps() is then (2, bins) and
+    get_correlation() follows the left/right phase correlation.
+
+    An optional `meter` (see loudness.LoudnessMeter) is fed every frame that leaves the ring exactly
+    once, including frames the STFT skips or that a precomputed spectrogram makes unnecessary.
+
+    With an `onset_filterbank` set, every analysed window also yields the spectral flux of its bands,
+    queued in `onsets` for the main thread's beat tracker."""
+
+    def __init__(
+        self,
+        fft_size: int,
+        window: np.ndarray,
+        hop_size: int = None,
+        ring_blocks: int = gp.ring_buffer_blocks,
+        stereo: bool = False,
+    ) -> None:
+        self.fft_size = fft_size
+        self.hop_size = fft_size if hop_size is None else min(hop_size, fft_size)
+        self.mono_kernel = SpectrumKernel(fft_size, window)
+        self.stereo_kernel = StereoKernel(fft_size, window) if stereo else None
+        self.kernel = self.mono_kernel
+        self.ring_blocks = ring_blocks
+        self.ring = RingBuffer(fft_size * ring_blocks, 1, gp.dtype)
+        self.history = np.zeros((fft_size, 1), dtype=gp.dtype)
+        self.scratch = np.zeros((self.hop_size, 1), dtype=gp.dtype)
+        self.meter = None
+        # set by the main thread, the worker resets the meter before its next hop so only it touches the state
+        self.meter_reset = False
+        self.onset_filterbank = None
+        self.onset_detector = OnsetDetector()
+        self.onset_value = np.zeros((1, 1), dtype=np.float32)
+        self.onsets = RingBuffer(256, 1, np.float32)
+        # kernel and spectra are swapped together by reset(), the worker reads the pair once per window
+        self.output = (self.kernel, np.zeros((2, self.kernel.bins), dtype=np.float32))
+        self.correlations = [1.0, 1.0]
+        self.front = 0
+        self.frames_analyzed = 0
+        # cleared while a precomputed spectrogram stands in for the live analysis
+        self.live = True
+        self.running = False
+        self.thread = None
+        # the worker polls instead of waiting on an Event so the callback never touches a lock
+        self.poll_interval = 0.002
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def reset(self, channels: int, meter=None):
+        """called before a new stream starts, swaps in a ring matching the track's channel count"""
+        self.meter = meter
+        self.meter_reset = False
+        self.history = np.zeros((self.fft_size, channels), dtype=gp.dtype)
+        self.scratch = np.zeros((self.hop_size, channels), dtype=gp.dtype)
+        self.ring = RingBuffer(self.fft_size * self.ring_blocks, channels, gp.dtype)
+        if self.stereo_kernel is not None and channels == 2:
+            self.kernel = self.stereo_kernel
+            self.output = (self.kernel, np.zeros((2, 2, self.kernel.bins), dtype=np.float32))
+        elif self.kernel is not self.mono_kernel:
+            self.kernel = self.mono_kernel
+            self.output = (self.kernel, np.zeros((2, self.kernel.bins), dtype=np.float32))
+        self.clear()
+
+    def clear(self):
+        self.output[1].fill(0)
+        self.correlations[:] = [1.0, 1.0]
+
+    def request_meter_reset(self):
+        """main thread: the meter starts over at the worker's next hop, e.g. on a gapless track change"""
+        self.meter_reset = True
+
+    def push(self, data: np.ndarray):
+        """audio thread side; only copies the frames into the ring"""
+        self.ring.write(data)
+
+    def get_amps(self) -> np.ndarray:
+        return self.output[1][self.front]
+
+    def get_correlation(self) -> float:
+        return self.correlations[self.front]
+
+    def measure(self, ring: RingBuffer, scratch: np.ndarray, hops: int):
+        """passes hops the STFT does not need through the meter only, or drops them without one"""
+        meter = self.meter
+        if meter is None:
+            ring.skip(hops * self.hop_size)
+            return
+        for _ in range(hops):
+            n = ring.read(scratch)
+            meter.process(scratch[:n])
+
+    def run(self):
+        while self.running:
+            if not self.step():
+                time.sleep(self.poll_interval)
+
+    def step(self) -> bool:
+        """consumes every whole hop in the ring; False when there was nothing to do. The worker thread
+        loops on it, headless rendering calls it directly after pushing a block"""
+        if self.meter_reset:
+            self.meter_reset = False
+            if self.meter is not None:
+                self.meter.reset()
+        hop = self.hop_size
+        ring, history, scratch = self.ring, self.history, self.scratch
+        hops = ring.available_read() // hop
+        # nothing to do yet, or reset() is halfway through swapping the buffers for a new track
+        if hops == 0 or history.shape[1] != ring.channels or scratch.shape[1] != ring.channels:
+            return False
+        if not self.live:
+            self.measure(ring, scratch, hops)
+            return True
+        # hops older than a full window can not reach the history, skip them
+        max_hops = self.fft_size // hop
+        if hops > max_hops:
+            self.measure(ring, scratch, hops - max_hops)
+            hops = max_hops
+        for _ in range(hops):
+            history[:-hop] = history[hop:]
+            if ring.read(history[-hop:]) < hop or ring is not self.ring:
+                break
+            if self.meter is not None:
+                self.meter.process(history[-hop:])
+            self.analyze(history)
+        return True
+
+    def analyze(self, block: np.ndarray):
+        kernel, spectra = self.output
+        back = 1 - self.front
+        kernel.process(block, spectra[back])
+        self.correlations[back] = kernel.correlation
+        filterbank = self.onset_filterbank
+        if filterbank is not None:
+            self.onset_value[0, 0] = self.onset_detector.process_spectrum(filterbank, spectra[back])
+            self.onsets.write(self.onset_value)
+        self.front = back
+        self.frames_analyzed += 1
@@ -1,9 +1,29 @@
-import threading, time, io, pyaudio, pygame as pg, numpy as np, soundfile as sf, globals as gp
+import threading, time, os, struct, concurrent.futures, numpy as np, soundfile as sf, globals as gp
 import m_platform as pf
-from scipy.fft import fft
+from analyzer import Analyzer
+from spectrogram import SpectrogramCache
+from library import LibraryIndex
+from decoder import ReadAhead
+from pcmcache import PCMCache
+from filterbank import get_filterbank
+from loudness import LoudnessMeter
+from rhythm import OnsetDetector, BeatTracker
+from waveform import PeakCache
+from telemetry import CallbackTelemetry, TelemetryAggregator
+from covers import CoverCache
+from utilities.ScaleCache import scale_cache
 from scipy.signal.windows import hann
+from mutagen import MutagenError
 from mutagen.mp3 import MP3
-from mutagen.flac import FLAC
+
+try:
+    import pyaudio
+
+    PA_CONTINUE, PA_COMPLETE = pyaudio.paContinue, pyaudio.paComplete
+except ImportError:
+    # headless rendering (render.py) never opens a device
+    pyaudio = None
+    PA_CONTINUE, PA_COMPLETE = 0, 1
 
 
 class AudioFileTypeError(Exception):
@@ -11,6 +31,19 @@ class AudioFileTypeError(Exception):
         self.message = "File is not a valid audio file or does not exist"
 
 
+class NullStream:
+    """stands in for a PyAudio stream when rendering headless, AudioManager.pump() plays the device"""
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
 class AudioFile:  # struct everything should be public
     IDLE = "IDLE"
     PLAYING = "PLAYING"
@@ -29,57 +62,159 @@ class AudioFile:  # struct everything should be public
     }
 
     @staticmethod
-    def get_flac_img(filepath):
-        audio = FLAC(filepath)
-        for p in audio.pictures:
-            if p.type == 3:
-                return p.data
-        return None
+    def default_meta_data(filepath: str):
+        d = {tag: None for tag in AudioFile.mp3_tag_to_flac_tag.values()}
+        d["title"] = os.path.basename(filepath)
+        return d
 
     @staticmethod
-    def get_mp3_img(filepath):
+    def probe_flac(filepath: str, start: int = 0):
+        """walks the FLAC metadata blocks once: stream info, vorbis comments and the front cover's position.
+        `start` is where the stream begins, past an ID3 tag some taggers put in front"""
+        d = AudioFile.default_meta_data(filepath)
+        info = {"format": "FLAC", "duration": 0, "sample_rate": 0, "channels": 0, "tags": d, "cover": None}
+        wanted = set(AudioFile.mp3_tag_to_flac_tag.values())
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            if f.read(4) != b"fLaC":
+                raise AudioFileTypeError
+            last = False
+            while not last:
+                header = f.read(4)
+                if len(header) < 4:
+                    break
+                last = header[0] & 0x80
+                block_type = header[0] & 0x7F
+                length = int.from_bytes(header[1:], "big")
+                start = f.tell()
+                if block_type == 0:  # STREAMINFO
+                    block = f.read(length)
+                    packed = int.from_bytes(block[10:18], "big")
+                    info["sample_rate"] = packed >> 44
+                    info["channels"] = ((packed >> 41) & 0x7) + 1
+                    total_samples = packed & 0xFFFFFFFFF
+                    info["duration"] = total_samples / info["sample_rate"] if info["sample_rate"] else 0
+                elif block_type == 4:  # VORBIS_COMMENT, little endian lengths
+                    block = f.read(length)
+                    pos = 4 + int.from_bytes(block[0:4], "little")
+                    count = int.from_bytes(block[pos : pos + 4], "little")
+                    pos += 4
+                    for _ in range(count):
+                        size = int.from_bytes(block[pos : pos + 4], "little")
+                        key, _, value = block[pos + 4 : pos + 4 + size].decode("utf-8", "replace").partition("=")
+                        pos += 4 + size
+                        key = key.lower()
+                        if key in wanted and value:
+                            d[key] = value
+                            wanted.discard(key)
+                elif block_type == 6 and info["cover"] is None:  # PICTURE
+                    pic_type, mime_len = struct.unpack(">II", f.read(8))
+                    f.seek(mime_len, 1)
+                    (desc_len,) = struct.unpack(">I", f.read(4))
+                    f.seek(desc_len + 16, 1)
+                    (data_len,) = struct.unpack(">I", f.read(4))
+                    if pic_type == 3:
+                        info["cover"] = (f.tell(), data_len)
+                f.seek(start + length)
+        return info
+
+    @staticmethod
+    def probe_mp3(filepath: str):
+        """one mutagen parse for stream info and tags; the APIC payload is then located in the raw ID3 block.
+        An unsynchronised tag doesn't hold it verbatim, the cover offset is then -1: decode it with mutagen"""
         audio = MP3(filepath)
-        for t in list(audio.tags.keys()):
-            if "APIC" in t:
-                return audio.tags[t].data
-        return None
+        d = AudioFile.default_meta_data(filepath)
+        info = {
+            "format": "MP3",
+            "duration": audio.info.length,
+            "sample_rate": audio.info.sample_rate,
+            "channels": audio.info.channels,
+            "tags": d,
+            "cover": None,
+        }
+        if audio.tags is None:
+            return info
+        for k, tag in AudioFile.mp3_tag_to_flac_tag.items():
+            val = audio.get(k)
+            if val is not None:
+                d[tag] = str(val[0])
+        for k in audio.tags.keys():
+            if "APIC" in k:
+                data = audio.tags[k].data
+                with open(filepath, "rb") as f:
+                    offset = f.read(audio.tags.size).find(data)
+                info["cover"] = (offset if offset >= 0 else -1, len(data))
+                break
+        return info
 
     @staticmethod
-    def get_meta_data(filepath: str, format: str):
-        d = {}
-        if format == "MP3":
-            audio = MP3(filepath)
-            for k in AudioFile.mp3_tag_to_flac_tag.keys():
-                val = audio.get(k)
-                d[AudioFile.mp3_tag_to_flac_tag[k]] = val[0] if val is not None else None
-        if format == "FLAC":
-            audio = FLAC(filepath)
-            for k in AudioFile.mp3_tag_to_flac_tag.values():
-                val = audio.get(k)
-                if val:
-                    d[k] = val[0]
-        if d["title"] == None:
-            d["title"] = filepath.split("\\" if pf.PLATFORM == "Windows" else "/")[-1]
-        return d
+    def probe(filepath: str):
+        """format, duration, sample rate, channels, tags and cover art position in a single pass over the file"""
+        start = 0
+        with open(filepath, "rb") as f:
+            magic = f.read(10)
+            if magic[:3] == b"ID3" and len(magic) == 10:
+                # an ID3 tag can precede any stream, skip its syncsafe size (and footer) to see what follows
+                start = 10 + (magic[6] << 21 | magic[7] << 14 | magic[8] << 7 | magic[9])
+                start += 10 if magic[5] & 0x10 else 0
+                f.seek(start)
+                magic = f.read(4)
+        if magic[:4] == b"fLaC":
+            return AudioFile.probe_flac(filepath, start)
+        if start or filepath.lower().endswith(".mp3"):
+            try:
+                return AudioFile.probe_mp3(filepath)
+            except MutagenError:
+                if filepath.lower().endswith(".mp3"):
+                    raise
+        info = sf.info(filepath)
+        return {
+            "format": info.format,
+            "duration": info.duration,
+            "sample_rate": info.samplerate,
+            "channels": info.channels,
+            "tags": AudioFile.default_meta_data(filepath),
+            "cover": None,
+        }
 
-    def __init__(self, filepath: str, fft_size):
+    def __init__(
+        self,
+        filepath: str,
+        fft_size,
+        frames_per_buffer: int = None,
+        library: LibraryIndex = None,
+        synchronous: bool = False,
+    ):
         try:
             t = time.perf_counter()
             self.filepath = filepath
             self.file = sf.SoundFile(filepath)
             self.state = AudioFile.IDLE
-            info = sf.info(filepath)
-            self.format = info.format
-            self.meta_data = AudioFile.get_meta_data(self.filepath, self.format)
+            stat = LibraryIndex.stat(filepath)
+            info = None if library is None else library.lookup(filepath, stat)
+            if info is None:
+                info = AudioFile.probe(filepath)
+                if library is not None:
+                    library.store(filepath, info, stat)
+            self.format = info["format"]
+            self.meta_data = info["tags"]
+            self.cover = info["cover"]
             print(self.meta_data)
-            self.og_img = None
+            self.thumbnails = None  # CoverMips from the cover cache, the full size art is never kept
             self.resized_img = None
-            self.duration = info.duration
+            self.duration = self.file.frames / self.file.samplerate
             self.sample_rate = self.file.samplerate
             self.channels = self.file.channels
-            self.stream: pyaudio.Stream = None
+            self.stream: "pyaudio.Stream" = None
             self.samples_passed = 0
             self.fft_size = fft_size
+            self.frames_per_buffer = fft_size if frames_per_buffer is None else frames_per_buffer
+            self.reader = ReadAhead(self.file, synchronous=synchronous)
+            # decoded PCM cache: handed over by the main thread, adopted by the callback
+            self.pcm = None
+            self.pending_pcm = None
+            self.pcm_pos = 0
+            self.out_block = np.zeros((self.frames_per_buffer, self.channels), dtype=gp.dtype)
             print(f"loaded in:{time.perf_counter()-t}")
 
         except Exception as e:
@@ -87,42 +222,38 @@ class AudioFile:  # struct everything should be public
             print(e)
             raise AudioFileTypeError
 
-    def load_img(self):
-        if self.og_img is not None:
-            return 0
-        if self.format == "FLAC":
-            og_img = AudioFile.get_flac_img(self.filepath)
-        elif self.format == "MP3":
-            og_img = AudioFile.get_mp3_img(self.filepath)
-        try:
-            self.og_img = pg.image.load(io.BytesIO(og_img)).convert_alpha()
-            return 0
-        except pg.error:
-            self.og_img = None
-            return -1
+    def can_follow(self, other: "AudioFile"):
+        """whether this track can be fed into other's already running stream"""
+        return (
+            other is not self
+            and self.sample_rate == other.sample_rate
+            and self.channels == other.channels
+            and self.frames_per_buffer == other.frames_per_buffer
+        )
 
-    def resize_img(self, size: tuple):
-        if self.load_img() == 0:
-            self.resized_img = pg.transform.smoothscale(self.og_img, size)
+    def resize_img(self, size: tuple, smooth: bool = True):
+        """scaled from the smallest thumbnail that is still large enough, nothing until they arrived"""
+        if self.thumbnails is not None:
+            level = self.thumbnails.level_for(int(size[0]))
+            # the preview gets its corners masked in place, so it can't be the cached surface itself
+            self.resized_img = scale_cache.scale(level, size, smooth).copy()
 
     def get_resized_img(self):
         return self.resized_img
 
-    def get_og_img(self):
-        return self.og_img
-
-    def open_stream_output(self, loader: pyaudio.PyAudio, callback):
+    def open_stream_output(self, loader: "pyaudio.PyAudio", callback):
         return loader.open(
             rate=self.sample_rate,
             channels=self.channels,
             format=pyaudio.paInt16,
             output=True,
-            frames_per_buffer=self.fft_size,
+            frames_per_buffer=self.frames_per_buffer,
             stream_callback=callback,
             start=False,
         )
 
-    def start(self, stream: pyaudio.Stream):
+    def start(self, stream: "pyaudio.Stream"):
+        self.reader.start()
         self.stream = stream
         self.stream.start_stream()
         self.state = AudioFile.PLAYING
@@ -130,7 +261,10 @@ class AudioFile:  # struct everything should be public
 
     def seek_to(self, seconds: float):
         self.samples_passed = seconds * self.sample_rate
-        self.file.seek(int(seconds * self.sample_rate))
+        if self.pcm is not None:
+            self.pcm_pos = int(seconds * self.sample_rate)
+        else:
+            self.reader.seek(int(seconds * self.sample_rate))
 
     def get_pos(self):
         """returns time pass from a song in seconds"""
@@ -142,11 +276,50 @@ class AudioFile:  # struct everything should be public
         elif self.state == AudioFile.PAUSED:
             self.state = AudioFile.PLAYING
 
+    def get_block(self, frame_count: int):
+        """the buffer the callback fills, reused between callbacks"""
+        if frame_count != len(self.out_block):
+            self.out_block = np.zeros((frame_count, self.channels), dtype=gp.dtype)
+        return self.out_block
+
+    def read_block(self, frame_count: int):
+        """audio thread: returns (block, frames read); with the PCM cache a full block is a zero-copy
+        slice of the memmap, otherwise frames come from the read-ahead ring"""
+        if self.pending_pcm is not None:
+            self.pcm, self.pending_pcm = self.pending_pcm, None
+            self.pcm_pos = int(self.samples_passed)
+        if self.pcm is not None:
+            pos = self.pcm_pos
+            data = self.pcm[pos : pos + frame_count]
+            self.pcm_pos = pos + len(data)
+            if len(data) == frame_count:
+                return (data, frame_count)
+            out = self.get_block(frame_count)
+            out[: len(data)] = data
+            return (out, len(data))
+        out = self.get_block(frame_count)
+        return (out, self.reader.read(out))
+
+    def buffered_frames(self) -> int:
+        """audio thread: decoded frames waiting in the read-ahead ring, -1 when playing from the PCM cache"""
+        if self.pcm is not None:
+            return -1
+        return self.reader.ring.available_read()
+
+    def finished(self):
+        if self.pcm is not None:
+            return self.pcm_pos >= len(self.pcm)
+        return self.reader.finished()
+
+    def close_file(self):
+        self.reader.stop()
+        self.file.close()
+
     def terminate(self):
         self.stream.stop_stream()
         self.stream.close()
         self.state = AudioFile.FINISHED
-        self.file.close()
+        self.close_file()
         print("terminated")
 
     def stop_stream(self):
@@ -171,7 +344,16 @@ class AudioManager:
     PENDING = 2
     ERROR = 3
 
-    def __init__(self, app, fft_size: int = 2048, sample_rate: int = 44100, bands_number: int = None):
+    def __init__(
+        self,
+        app,
+        fft_size: int = 2048,
+        sample_rate: int = 44100,
+        bands_number: int = None,
+        low_latency: bool = gp.low_latency,
+        stereo: bool = False,
+        headless: bool = False,
+    ):
         self.app = app
         self.seeking_lock = threading.Lock()
         self.lock = threading.Lock()
@@ -182,22 +364,118 @@ class AudioManager:
         self.hanning_window = hann(fft_size)
         self.bars = None
         self.num_averages = 0
-        self.amps = [0 for _ in range(self.fft_size // 2)]
+        self.low_latency = low_latency
+        self.frames_per_buffer = gp.low_latency_frames_per_buffer if low_latency else fft_size
+        hop_size = gp.low_latency_hop_size if low_latency else fft_size
+        # stereo keeps both channels of two channel tracks apart, always analysed live
+        self.stereo = stereo
+        self.analyzer = Analyzer(fft_size, self.hanning_window, hop_size, stereo=stereo)
+        # headless: no device and no threads in the audio path, pump() decodes and analyses in step
+        self.headless = headless
+        self.pump_debt = 0.0
+        if not headless:
+            self.analyzer.start()
+        self.spectrograms = SpectrogramCache(gp.spectrogram_cache_dir, gp.spectrogram_cache_size, fft_size, hop_size)
+        self.spectrogram = None
+        # (bands, scale, pooling) the bars asked for, the filterbank itself follows the playing track's rate
+        self.band_layout = None
+        self.filterbank = None
+        self.band_amps = None
+        self.stereo_amps = None
+        self.balance = None
+        self.peaks = PeakCache(gp.waveform_cache_dir, gp.waveform_cache_size)
+        self.covers = CoverCache(gp.cover_cache_dir, gp.cover_cache_size, gp.cover_thumbnail_size, gp.cover_thumbnail_min)
+        self.pcm_cache = PCMCache(gp.pcm_cache_dir, gp.pcm_cache_size) if gp.pcm_cache else None
+        self.library = LibraryIndex(gp.library_index_path)
+        self.callback_last_time = 0
+        self.callback_worst_time = 0
+        self.telemetry = None
+        self.telemetry_aggregator = None
+        if gp.audio_telemetry:
+            self.telemetry = CallbackTelemetry()
+            self.telemetry_aggregator = TelemetryAggregator(
+                self.telemetry,
+                lambda: self.sample_rate if self.current is None else self.current.sample_rate,
+                gp.audio_telemetry_interval,
+                gp.audio_telemetry_path,
+            )
+            self.telemetry_aggregator.start()
+        # fed with one onset strength per analysis hop, from the analyzer or the spectrogram rows
+        self.beat_tracker = BeatTracker(sample_rate / self.analyzer.hop_size)
+        self.onset_detector = OnsetDetector()
+        self.onset_strengths = np.zeros((self.analyzer.onsets.capacity, 1), dtype=np.float32)
+        self.rhythm_row = None
+        self.beats_seen = 0
         self.init_pyaudio()
-        pf.init_platform_audio(self.check_output_change)
+        if not headless:
+            pf.init_platform_audio(self.check_output_change)
         self.timeline_update_status = (False, False)  # (updated,pressed)
         self.cache = {}
         self.current_index = 0
+        self.preloader = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.preloading = {}
+        # set by the main thread when the preloaded next track can share the current stream,
+        # consumed by the callback at the end of the current track
+        self.next_file: AudioFile = None
+        self.switched_from: AudioFile = None
+        self.finished_at = None
+        self.track_change_latency = None
 
     def init_pyaudio(self):
+        if self.headless:
+            self.loader = None
+            self.default_output_device = None
+            return
         self.loader = pyaudio.PyAudio()
         self.default_output_device = self.loader.get_default_output_device_info()["name"]
 
     def add(self, filepaths):
         """should be called by another thread"""
-        for filepath in filepaths:
-            self.audio_queue.append(filepath)
-        print(self.audio_queue)
+        self.audio_queue.extend(filepaths)
+        self.request_track_caches()
+
+    def request_track_caches(self):
+        """only the playing track and the next few get precomputed, not whole dropped libraries"""
+        start = max(self.current_index - 1, 0)
+        for filepath in self.audio_queue[start : self.current_index + gp.spectrogram_lookahead]:
+            if self.band_layout is not None and not self.stereo:
+                self.spectrograms.request(filepath, *self.band_layout)
+            if self.pcm_cache is not None:
+                self.pcm_cache.request(filepath)
+            self.peaks.request(filepath)
+
+    def adopt_pcm(self):
+        """hands the decoded PCM memmap to the callback once it is ready and retires the read-ahead thread"""
+        if self.pcm_cache is None:
+            return
+        if self.current.pcm is None and self.current.pending_pcm is None:
+            pcm = self.pcm_cache.get(self.current.filepath)
+            if pcm is not None and pcm.shape[1] == self.current.channels:
+                self.current.pending_pcm = pcm
+        elif self.current.pcm is not None and self.current.reader.thread is not None:
+            self.current.reader.stop()
+
+    def set_bands(self, bands: int = None, scale: str = gp.band_scale, pooling: str = gp.band_pooling):
+        """band layout of the bars, also the one the spectrogram cache reduces to; returns the filterbank
+        for the current sample rate"""
+        self.band_layout = (bands, scale, pooling)
+        self.use_spectrogram(None)
+        self.request_track_caches()
+        return self.update_filterbank()
+
+    def update_filterbank(self):
+        """swaps in the cached filterbank for the playing track's sample rate, between two frames"""
+        if self.band_layout is None:
+            return None
+        sample_rate = self.sample_rate if self.current is None else self.current.sample_rate
+        filterbank = get_filterbank(sample_rate, self.fft_size, *self.band_layout)
+        self.analyzer.onset_filterbank = filterbank
+        if filterbank is not self.filterbank:
+            self.band_amps = np.zeros(filterbank.count, dtype=np.float32)
+            self.stereo_amps = np.zeros((2, filterbank.count), dtype=np.float32)
+            self.balance = np.zeros(filterbank.count, dtype=np.float32)
+            self.filterbank = filterbank
+        return filterbank
 
     def check_output_change(self):
         while True:
@@ -205,23 +483,67 @@ class AudioManager:
                 self.terminate(clear=False)
                 self.init_pyaudio()
                 if self.current is not None:
-                    self.current.start(self.current.open_stream_output(self.loader, self.callback_func))
+                    self.current.start(self.open_stream())
             time.sleep(1)
 
+    def preload_file(self, filepath):
+        """runs on the preloader thread: opens, probes and starts decoding ahead of playback"""
+        try:
+            audio_file = AudioFile(filepath, self.fft_size, self.frames_per_buffer, self.library, self.headless)
+            audio_file.reader.start()
+        except AudioFileTypeError:
+            audio_file = None
+        self.cache[filepath] = audio_file
+
+    def preload(self):
+        for filepath in self.audio_queue[self.current_index : self.current_index + gp.preload_tracks]:
+            if filepath not in self.cache and filepath not in self.preloading:
+                self.preloading[filepath] = self.preloader.submit(self.preload_file, filepath)
+        for filepath in [f for f, future in self.preloading.items() if future.done()]:
+            del self.preloading[filepath]
+            self.request_cover(self.cache.get(filepath))
+        self.drop_stale_preloads()
+
+        next_file = None
+        if self.current is not None and self.current_index < len(self.audio_queue):
+            candidate = self.cache.get(self.audio_queue[self.current_index])
+            if candidate is not None and candidate.can_follow(self.current):
+                next_file = candidate
+        self.next_file = next_file
+
     def get_audio_file(self, filepath) -> None | AudioFile:
+        future = self.preloading.pop(filepath, None)
+        if future is not None:
+            future.result()
         try:
             if self.cache.get(filepath) is None:
-                self.cache[filepath] = AudioFile(filepath, self.fft_size)
+                self.cache[filepath] = AudioFile(
+                    filepath, self.fft_size, self.frames_per_buffer, self.library, self.headless
+                )
         except AudioFileTypeError:
             self.cache[filepath] = None
         return self.cache[filepath]
 
     def del_audio_cache(self, filepath):
-        if self.cache.get(filepath) is not None:
-            del self.cache[filepath]
+        """drops a cached track, stopping its read-ahead thread and closing its file"""
+        audio_file = self.cache.pop(filepath, None)
+        if audio_file is not None and audio_file is not self.current:
+            audio_file.close_file()
+
+    def drop_stale_preloads(self):
+        """tracks preloaded for a queue position that skips, previous or queue edits have moved away from"""
+        keep = set(self.audio_queue[max(self.current_index - 1, 0) : self.current_index + gp.preload_tracks])
+        for filepath in [f for f in self.cache if f not in keep and f not in self.preloading]:
+            self.del_audio_cache(filepath)
 
     def update(self, img_size):
+        if self.switched_from is not None:
+            return self.finish_gapless_switch(img_size)
+
         if self.current is not None and self.current.state != AudioFile.FINISHED:
+            self.preload()
+            self.adopt_pcm()
+            self.update_rhythm()
             return 2
 
         if self.current is not None and self.current.state == AudioFile.FINISHED:
@@ -229,6 +551,7 @@ class AudioManager:
 
         if self.current_index == len(self.audio_queue):
             self.current = None
+            self.use_spectrogram(None)
             return 0
 
         if self.current_index > 0:
@@ -236,15 +559,65 @@ class AudioManager:
 
         self.current = self.get_audio_file(self.audio_queue[self.current_index])
         if self.current is None:
+            self.use_spectrogram(None)
             self.audio_queue.pop(self.current_index)
             print("error loading file")
             return 3
-        stream = self.current.open_stream_output(self.loader, self.callback_func)
+        meter = LoudnessMeter(self.current.sample_rate, self.current.channels) if gp.loudness_meter else None
+        self.analyzer.reset(self.current.channels, meter)
+        self.use_spectrogram(None)
+        self.reset_rhythm()
+        self.update_filterbank()
+        self.callback_worst_time = 0
+        stream = self.open_stream()
         self.current.start(stream)
         self.current_index += 1
+        self.request_track_caches()
+        self.record_track_change(time.perf_counter())
+        self.request_cover(self.current)
+        self.adopt_cover()
         self.current.resize_img(img_size)
         return 1
 
+    def finish_gapless_switch(self, img_size):
+        """main thread half of a switch the callback already made inside the running stream"""
+        previous = self.switched_from
+        self.switched_from = None
+        previous.close_file()
+        self.del_audio_cache(self.audio_queue[self.current_index - 1])
+        self.current_index += 1
+        self.use_spectrogram(None)
+        self.analyzer.request_meter_reset()
+        self.reset_rhythm()
+        self.update_filterbank()
+        self.request_track_caches()
+        self.request_cover(self.current)
+        self.adopt_cover()
+        self.current.resize_img(img_size)
+        return 1
+
+    def request_cover(self, audio_file: AudioFile):
+        if audio_file is not None and audio_file.cover is not None:
+            self.covers.request(audio_file.filepath, audio_file.cover)
+
+    def adopt_cover(self) -> bool:
+        """takes the playing track's thumbnails once the worker made them, True the frame they arrive.
+        Headless runs wait for them so rendered frames don't depend on timing"""
+        current = self.current
+        if current is None or current.cover is None or current.thumbnails is not None:
+            return False
+        current.thumbnails = self.covers.get(current.filepath, wait=self.headless)
+        return current.thumbnails is not None
+
+    def record_track_change(self, started_at: float):
+        if self.finished_at is not None:
+            self.track_change_latency = started_at - self.finished_at
+        self.finished_at = None
+
+    def get_track_change_latency(self):
+        """seconds between the end of the last track and the first sample of the next, 0 when gapless"""
+        return self.track_change_latency
+
     def get_buttons_state(self):
         if self.current is not None:
             duration = self.current.duration
@@ -265,28 +638,33 @@ class AudioManager:
             "toggle": toggle,
         }
 
-    def resize_preview(self, size):
+    def resize_preview(self, size, smooth: bool = True):
         if self.current is None:
             return None
-        self.current.resize_img(size)
+        self.current.resize_img(size, smooth)
         return self.current.get_resized_img()
 
     def empty_queue(self):
         if self.current is None or len(self.audio_queue) == 0:
             return
         self.audio_queue.clear()
+        self.drop_stale_preloads()
 
     def skip(self):
         if self.current is not None:
+            self.next_file = None
             self.current.terminate()
-            self.amps = [0 for _ in range(self.fft_size)]
+            self.finished_at = time.perf_counter()
+            self.analyzer.clear()
 
     def previous(self):
         if self.current is not None:
+            self.next_file = None
             self.current.terminate()
+            self.finished_at = time.perf_counter()
             self.del_audio_cache(self.audio_queue[self.current_index - 1])
             self.current_index = max(self.current_index - 2, 0)
-            self.amps = [0 for _ in range(self.fft_size)]
+            self.analyzer.clear()
 
     def toggle_pause(self):
         if self.current is not None:
@@ -301,29 +679,21 @@ class AudioManager:
             self.current.stop_stream()
         if clear:
             self.audio_queue.clear()
-        self.loader.terminate()
-
-    def get_usable_freq(self, bands_number: int = None) -> dict:
-        usable_freq_indexes = []
-
-        usable_range = self.fft_size // 2
-        if bands_number is not None:
-            step = (gp.end_frequency / gp.start_frequency) ** (1 / bands_number)
-            curr_freq = gp.start_frequency
-        else:
-            step = 1.06
-            curr_freq = 1
-        frequencies = []
-        while True:
-            index = int(curr_freq * self.fft_size / self.sample_rate)
-            if index > usable_range:
-                break
-            usable_freq_indexes.append(index)
-            frequencies.append(curr_freq)
-            curr_freq *= step
-
-        usable_freq_indexes = sorted(set(usable_freq_indexes))
-        return {"frequencies": frequencies, "indexes": usable_freq_indexes}
+            self.analyzer.stop()
+            self.spectrograms.shutdown()
+            self.peaks.shutdown()
+            self.covers.shutdown()
+            if self.pcm_cache is not None:
+                self.pcm_cache.shutdown()
+            self.preloader.shutdown(wait=False, cancel_futures=True)
+            for filepath in list(self.cache):
+                self.del_audio_cache(filepath)
+            self.library.close()
+            if self.telemetry_aggregator is not None:
+                self.telemetry_aggregator.stop()
+            print(f"callback worst case: {self.callback_worst_time * 1000:.3f}ms")
+        if self.loader is not None:
+            self.loader.terminate()
 
     def get_audio_state(self):
         return AudioManager.NONE if self.current is None else self.current.state
@@ -344,8 +714,113 @@ class AudioManager:
             else AudioManager.PREV_AVAILABLE
         )
 
+    def use_spectrogram(self, spectrogram):
+        self.spectrogram = spectrogram
+        self.analyzer.live = spectrogram is None
+        # onsets switch source, the tracker keeps its tempo and finds the beat again
+        self.analyzer.onsets.clear()
+        self.onset_detector.reset()
+        self.rhythm_row = None
+        self.beat_tracker.resync()
+
+    def reset_rhythm(self):
+        """new tracker for the playing track's hop rate, seeded with its tagged tempo"""
+        try:
+            bpm = float(self.current.meta_data.get("bpm") or 0) or None
+        except ValueError:
+            bpm = None
+        self.beat_tracker = BeatTracker(self.current.sample_rate / self.analyzer.hop_size, bpm)
+        self.beats_seen = 0
+
+    def update_rhythm(self):
+        """feeds the beat tracker every analysis hop played since the last frame"""
+        tracker = self.beat_tracker
+        spectrogram = self.spectrogram
+        if spectrogram is None:
+            n = self.analyzer.onsets.read(self.onset_strengths)
+            for strength in self.onset_strengths[:n, 0].tolist():
+                tracker.process(strength)
+            return
+        k = spectrogram.row_index(self.current.samples_passed)
+        if self.rhythm_row is None or k < self.rhythm_row or k - self.rhythm_row > len(self.onset_strengths):
+            # first frame from this spectrogram or a seek, start over from the current row
+            self.onset_detector.reset()
+            tracker.resync()
+            self.rhythm_row = k - 1
+        for row in range(self.rhythm_row + 1, k + 1):
+            tracker.process(self.onset_detector.process(spectrogram.row(row, self.band_amps)))
+        self.rhythm_row = k
+
+    def get_rhythm(self) -> dict:
+        """tempo in BPM (None until one is found), its confidence 0..1, the beat phase 0..1 and the
+        latest onset strength 0..1"""
+        tracker = self.beat_tracker
+        return {
+            "bpm": tracker.get_tempo(),
+            "confidence": tracker.confidence,
+            "phase": tracker.get_phase(),
+            "onset": tracker.onset,
+        }
+
+    def pop_beats(self) -> int:
+        """beats since the last call"""
+        beats = self.beat_tracker.beats - self.beats_seen
+        self.beats_seen = self.beat_tracker.beats
+        return beats
+
     def get_amps(self):
-        return self.amps
+        """band values of the current filterbank, from the precomputed spectrogram when there is one"""
+        filterbank, values = self.filterbank, self.band_amps
+        if filterbank is None:
+            return self.analyzer.get_amps()
+        if self.current is not None and self.spectrogram is None:
+            spectrogram = self.spectrograms.get(self.current.filepath, *self.band_layout)
+            if spectrogram is not None and spectrogram.count == filterbank.count:
+                self.use_spectrogram(spectrogram)
+        if self.spectrogram is not None and self.current is not None:
+            return self.spectrogram.frame_at(self.current.samples_passed, values)
+        return filterbank.reduce(self.analyzer.get_amps(), values)
+
+    def get_loudness(self):
+        """momentary, short-term and integrated LUFS plus true peak (dBTP) of the playing track, None
+        when the meter is off"""
+        meter = self.analyzer.meter
+        return None if meter is None else meter.get_readings()
+
+    def get_stereo_amps(self):
+        """(2, bands) left and right band values; tracks that are not two channel show on both sides"""
+        values = self.stereo_amps
+        spectra = self.analyzer.get_amps()
+        if spectra.ndim == 1:
+            self.filterbank.reduce(spectra, values[0])
+            values[1] = values[0]
+        else:
+            self.filterbank.reduce(spectra, values)
+        # -1 fully left .. 1 fully right, per band
+        np.subtract(values[1], values[0], out=self.balance)
+        self.balance /= values[0] + values[1] + 1e-6
+        return values
+
+    def get_balance(self):
+        """per band balance of the last get_stereo_amps()"""
+        return self.balance
+
+    def get_correlation(self) -> float:
+        """phase correlation of the analysed window, 1 mono, 0 unrelated, -1 antiphase"""
+        return self.analyzer.get_correlation()
+
+    def get_waveform(self):
+        """peak pyramid of the playing track once it has been computed, else None"""
+        return None if self.current is None else self.peaks.get(self.current.filepath)
+
+    def get_callback_stats(self):
+        """callback durations in seconds next to the buffer period they have to fit in"""
+        period = 0 if self.current is None else self.current.frames_per_buffer / self.current.sample_rate
+        return {"last": self.callback_last_time, "worst": self.callback_worst_time, "period": period}
+
+    def get_audio_telemetry(self):
+        """callback histograms and counters since start, None when gp.audio_telemetry is off"""
+        return None if self.telemetry_aggregator is None else self.telemetry_aggregator.get_summary()
 
     def set_audio_state(self, state):
         if self.current is None or state is AudioManager.NONE:
@@ -361,49 +836,92 @@ class AudioManager:
         if self.seeking_lock.acquire(blocking=True):
             try:
                 self.current.seek_to(seconds)
+                self.beat_tracker.resync()
             finally:
                 self.seeking_lock.release()
                 return 0
         return -2
 
+    def open_stream(self):
+        if self.headless:
+            return NullStream()
+        return self.current.open_stream_output(self.loader, self.callback_func)
+
+    def pump(self, seconds: float):
+        """headless: plays `seconds` of the current track through the callback on this thread and
+        analyses it right away, so rendering runs as fast as the frames can be drawn"""
+        if self.current is None or self.current.state != AudioFile.PLAYING:
+            return
+        self.pump_debt += seconds * self.current.sample_rate
+        while self.pump_debt >= self.frames_per_buffer:
+            if self.current.state != AudioFile.PLAYING:
+                self.pump_debt = 0.0
+                break
+            self.callback_func(None, self.frames_per_buffer, None, 0)
+            self.pump_debt -= self.frames_per_buffer
+            self.analyzer.step()
+
     def callback_func(self, in_data, frame_count, time_info, status):
+        """realtime thread: only moves decoded PCM (read-ahead ring or PCM cache) to the device and the analyzer"""
+        t = time.perf_counter()
+        out = self.current.get_block(frame_count)
+        paused = (
+            self.timeline_update_status[1] or self.current.state == AudioFile.PAUSED
+        ) and not self.timeline_update_status[0]
+        if paused or not self.seeking_lock.acquire(blocking=False):
+            out.fill(0)
+            event = CallbackTelemetry.PAUSED if paused else CallbackTelemetry.LOCKED
+            self.record_callback_time(t, frame_count, status, time_info, event)
+            return (out, PA_CONTINUE)
+
+        data, data_len = self.current.read_block(frame_count)
+        self.current.samples_passed += data_len
+
+        if data_len < frame_count and self.current.finished():
+            if self.next_file is not None and self.switched_from is None:
+                data_len += self.switch_to_next(data[data_len:])
+            elif data_len == 0:
+                self.current.state = AudioFile.FINISHED
+                self.finished_at = time.perf_counter()
+                self.seeking_lock.release()
+                self.record_callback_time(t, frame_count, status, time_info, CallbackTelemetry.FINISHED)
+                return (None, PA_COMPLETE)
 
-        if (
-            (self.timeline_update_status[1] or self.current.state == AudioFile.PAUSED) and not self.timeline_update_status[0]
-        ) or not self.seeking_lock.acquire(blocking=False):
-            return (np.zeros((frame_count, self.current.channels), dtype=np.int16), pyaudio.paContinue)
-
-        data = self.current.file.read(frames=frame_count, dtype=gp.dtype)
-        self.current.samples_passed += frame_count
-        data_len = len(data)
-
-        if data_len == 0:
-            self.current.state = AudioFile.FINISHED
-            self.seeking_lock.release()
-            return (None, pyaudio.paComplete)
-
-        if data_len < self.fft_size:
-            pad_width = self.fft_size - data_len
-            data = np.pad(data, (0, pad_width), mode="constant")
-
-        mono_data = np.mean(data, axis=1) if len(data.shape) > 1 else data
-        ffted_chunk = fft(mono_data * self.hanning_window, norm="forward", n=self.fft_size)
-        avg = ffted_chunk
-        # if self.num_averages > 1:
-        #     self.current.chunks_queue.append(ffted_chunk)
-        #     avg = np.average(self.current.chunks_queue, axis=0)
-        #     if len(self.current.chunks_queue) > self.num_averages:
-        #         self.current.chunks_queue.pop(0)
-
-        self.amps = np.log10(np.abs(avg) + 1e-6)
-
-        m = np.max(self.amps)
-        if m < 1e-6:
-            self.amps *= 0
-        else:
-            self.amps /= m
+        if data_len < frame_count:
+            data[data_len:] = 0
+
+        self.analyzer.push(data)
         self.seeking_lock.release()
+        self.record_callback_time(t, frame_count, status, time_info, CallbackTelemetry.AUDIO)
         if self.timeline_update_status[0]:
-            return (np.zeros((frame_count, self.current.channels), dtype=np.int16), pyaudio.paContinue)
-
-        return (data, pyaudio.paContinue)
+            out.fill(0)
+            return (out, PA_CONTINUE)
+
+        return (data, PA_CONTINUE)
+
+    def switch_to_next(self, rest: np.ndarray) -> int:
+        """audio thread: completes the block with the first frames of the preloaded track, so the
+        transition is sample exact and the stream keeps running"""
+        previous, following = self.current, self.next_file
+        self.next_file = None
+        following.samples_passed = following.reader.read(rest)
+        following.stream = previous.stream
+        following.state = AudioFile.PLAYING
+        previous.state = AudioFile.FINISHED
+        self.current = following
+        self.switched_from = previous
+        self.track_change_latency = 0
+        return following.samples_passed
+
+    def get_decoder_stats(self):
+        """read-ahead fill level in seconds, underrun stalls and low-watermark crossings of the playing track"""
+        return None if self.current is None else self.current.reader.get_stats()
+
+    def record_callback_time(self, start: float, frame_count: int, status, time_info, event: int):
+        self.callback_last_time = time.perf_counter() - start
+        if self.callback_last_time > self.callback_worst_time:
+            self.callback_worst_time = self.callback_last_time
+        if self.telemetry is not None:
+            self.telemetry.record(
+                start, self.callback_last_time, frame_count, status, time_info, event, self.current.buffered_frames()
+            )
@@ -1,45 +1,250 @@
+import numpy as np
 import pygame as pg
 from pygame import gfxdraw
+from collections import OrderedDict
 import globals as gp
 import utilities.functions as fn
-from math import ceil
 
 
-class Bar:
+cap_exclusions = {}
+
+
+def get_cap_exclusions(width: int, height: int, radius: int):
+    """(columns, rows) of the pixels pg.draw.rect leaves out of a (width, height) rect with rounded
+    corners; rows in the lower half are negative, counted from the bottom edge. Taken from pygame's own
+    rasterization once per size so both paths produce the same pixels."""
+    key = (width, height, radius)
+    exclusions = cap_exclusions.get(key)
+    if exclusions is None:
+        surf = pg.Surface((width, height), depth=32)
+        surf.fill((0, 0, 0))
+        pg.draw.rect(surf, (255, 255, 255), (0, 0, width, height), border_radius=radius)
+        columns, rows = np.nonzero(pg.surfarray.pixels2d(surf) == 0)
+        rows = np.where(rows < height / 2, rows, rows - height)
+        exclusions = cap_exclusions[key] = (columns, rows)
+    return exclusions
+
+
+def cap_pixels(lefts, tops, heights, width: int, radius: int, size: tuple):
+    """(xs, ys) inside the surface of the corner pixels pg.draw.rect leaves out of every bar"""
+    bottoms = tops + heights
+    capped = np.minimum(heights, 2 * radius + 2)  # taller bars share the caps of this height
+    xs, ys = [], []
+    for height in np.unique(capped[capped > 0]).tolist():
+        cap_columns, cap_rows = get_cap_exclusions(width, height, radius)
+        bars = np.nonzero(capped == height)[0]
+        x = lefts[bars, None] + cap_columns
+        y = np.where(cap_rows >= 0, tops[bars, None], bottoms[bars, None]) + cap_rows
+        keep = (x >= 0) & (x < size[0]) & (y >= 0) & (y < size[1])
+        xs.append(x[keep])
+        ys.append(y[keep])
+    if not xs:
+        return (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+    return (np.concatenate(xs), np.concatenate(ys))
+
+
+def build_color_strips(surface: pg.Surface, color_lut: np.ndarray, width: int) -> pg.Surface:
+    """one opaque column per LUT color, `width` wide and as tall as the surface, in its pixel format"""
+    strips = pg.Surface((width * len(color_lut), surface.get_height()), 0, surface)
+    for i, color in enumerate(color_lut.tolist()):
+        strips.fill(color, (i * width, 0, width, strips.get_height()))
+    return strips
+
+
+def draw_rounded_bars(surface: pg.Surface, strips: pg.Surface, xs, tops, width: int, heights, indexes, radius: int = 3):
+    """the pixels of pg.draw.rect(surface, lut[index], (x, top, width, height), border_radius=radius)
+    for every bar at once. The spans are copied from the LUT strips in a single Surface.blits batch,
+    which costs what the pixels cost, then the rounded corners are put back in one NumPy pass over
+    the surface: the pixels the precomputed cap masks leave out are saved before and restored after.
+    Pygame's rounded rect fills row by row, which made tall bars expensive."""
+    lefts = np.asarray(xs).astype(np.intp)
+    tops = np.asarray(tops).astype(np.intp)
+    heights = np.asarray(heights).astype(np.intp)
+    cap_xs, cap_ys = cap_pixels(lefts, tops, heights, width, radius, surface.get_size())
+    pixels = pg.surfarray.pixels2d(surface)
+    saved = pixels[cap_xs, cap_ys]
+    del pixels
+    sources = (np.asarray(indexes) * width).tolist()
+    surface.blits(
+        [
+            (strips, (x, y), (source, 0, width, h))
+            for x, y, h, source in zip(lefts.tolist(), tops.tolist(), heights.tolist(), sources)
+        ],
+        doreturn=False,
+    )
+    pixels = pg.surfarray.pixels2d(surface)
+    pixels[cap_xs, cap_ys] = saved
+    del pixels
+
+
+class BarField:
+    """All the bars of the WhiteBars style stored as arrays and updated at once."""
+
     scale = 300
     smoothing_scale = 12
     smoothing_color_scale = 75
+    lut_size = 256
+    # a beat lifts every target by up to pulse_gain, fading out at pulse_decay per second
+    pulse_gain = 0.15
+    pulse_decay = 5
+    # draw all bars with draw_rounded_bars instead of one pg.draw.rect each
+    rasterize = True
 
-    def __init__(self, frequency_index: tuple, pos, original_color, target_color: tuple = (255, 255, 255)) -> None:
-        self.pos = pos
-        self.frequency_index = frequency_index
-        self.height = 0
+    @staticmethod
+    def build_color_lut(original_color, target_color, size: int) -> np.ndarray:
+        """gradient sampled for amplitudes 0..1, indexed by amplitude * (size - 1)"""
+        t = np.linspace(0, 1, size)
+        return np.array(
+            [fn.color_interpolation(original_color, target_color, 1 - (1 - a) ** 0.3) for a in t], dtype=np.uint8
+        )
+
+    def __init__(self, count: int, xs, y, original_color=gp.bar_color, target_color: tuple = (255, 255, 255)) -> None:
+        self.count = count
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.y = y
+        self.amplitudes = np.zeros(self.count)
+        self.targets = np.zeros(self.count)
+        self.heights = np.zeros(self.count)
         self.original_color = original_color
-        self.color = original_color
         self.target_color = target_color
-        self.amplitude = 0
+        self.color_lut = BarField.build_color_lut(original_color, target_color, BarField.lut_size)
+        self.colors = np.zeros((self.count, 3), dtype=np.uint8)
+        self.colors[:] = original_color
+        self.color_indexes = np.zeros(self.count, dtype=np.intp)
+        self.strips = None
+        self.strips_key = None
+        self.pulse = 0.0
+
+    def beat(self, strength: float = 1.0):
+        self.pulse = max(self.pulse, strength)
+
+    def set_positions(self, xs, y):
+        self.xs[:] = xs
+        self.y = y
+
+    def move_by(self, offset):
+        self.y += offset
+
+    def compute_targets(self, amps, scale):
+        """amps holds one value per bar, already reduced by the AudioManager's filterbank"""
+        np.clip(amps, 0, 1, out=self.amplitudes)
+        np.multiply(self.amplitudes, scale * (1 + BarField.pulse_gain * self.pulse), out=self.targets)
+        np.floor(self.targets, out=self.targets)
+
+    def smooth(self, dt, min_height, max_height):
+        self.pulse = max(self.pulse - dt * BarField.pulse_decay, 0.0)
+        self.targets -= self.heights
+        self.targets *= dt * BarField.smoothing_scale
+        self.heights += self.targets
+        np.clip(self.heights, min_height, max_height, out=self.heights)
 
     def update(self, amps, dt, min_height, max_height):
-        if len(amps[self.frequency_index["index_range"][0] : self.frequency_index["index_range"][1]]) == 0:
-            self.amplitude = amps[self.frequency_index["index_range"][0]]
-        else:
-            self.amplitude = max(amps[self.frequency_index["index_range"][0] : self.frequency_index["index_range"][1]])
-        self.amplitude = fn.clamp(0, 1, self.amplitude)
-        target_height = int(self.amplitude * Bar.scale)
+        self.compute_targets(amps, BarField.scale)
+        self.color_indexes = (self.amplitudes * (BarField.lut_size - 1)).astype(np.intp)
+        self.colors = self.color_lut[self.color_indexes]
+        self.smooth(dt, min_height, max_height)
 
-        self.color = fn.color_interpolation(self.original_color, self.target_color, 1 - (1 - self.amplitude) ** 0.3)
-        self.height = fn.clamp(
-            min_height, max_height, self.height + (target_height - self.height) * dt * Bar.smoothing_scale
-        )
+    def spans(self):
+        """(tops, heights) of the rects draw() fills, before pygame truncates them"""
+        return (self.y - self.heights // 2, self.heights)
+
+    def state(self):
+        """changes whenever draw() would draw something else"""
+        return (self.y, self.heights.tobytes(), self.color_indexes.tobytes())
+
+    def bounds(self, width) -> pg.Rect | None:
+        """smallest rect covering everything draw() touches"""
+        if not self.count:
+            return None
+        tops, heights = self.spans()
+        top = int(np.min(tops)) - 1
+        bottom = int(np.max(tops + heights)) + 1
+        left = int(self.xs[0])
+        # bars start at float xs, pygame rounds them
+        right = int(np.ceil(self.xs[-1] + width)) + 1
+        return pg.Rect(left, top, right - left, bottom - top)
+
+    def get_strips(self, window, width: int):
+        """LUT color strips for draw_rounded_bars, None when the window can't be drawn to that way"""
+        if not BarField.rasterize or width <= 0 or window.get_bytesize() != 4:
+            return None
+        key = (width, window.get_height(), window.get_masks())
+        if key != self.strips_key:
+            self.strips = build_color_strips(window, self.color_lut, width)
+            self.strips_key = key
+        return self.strips
 
     def draw(self, window, width):
-        rect = pg.Rect(self.pos[0], self.pos[1] - self.height // 2, width, self.height)
-        pg.draw.rect(window, self.color, rect, border_radius=3)
+        strips = self.get_strips(window, int(width))
+        if strips is None:
+            return self.draw_rects(window, width)
+        tops, heights = self.spans()
+        draw_rounded_bars(window, strips, self.xs, tops, int(width), heights, self.color_indexes)
+
+    def draw_rects(self, window, width):
+        """one pg.draw.rect per bar, the reference draw_rounded_bars reproduces"""
+        y = self.y
+        for x, h, color in zip(self.xs.tolist(), self.heights.tolist(), self.colors.tolist()):
+            pg.draw.rect(window, color, (x, y - h // 2, width, h), border_radius=3)
+
+
+class StereoBarField(BarField):
+    """MirroredStereo style: left channel grows up and right channel down from the same baseline.
+
+    Each bar is still one rect per frame, spanning from the top of its left half to the bottom of its
+    right half, so it costs what WhiteBars costs. A centre line shows the phase correlation, fading to
+    antiphase_color as the channels cancel."""
+
+    antiphase_color = (169, 1, 1)
 
+    def __init__(self, count: int, xs, y, original_color=gp.bar_color, target_color: tuple = (255, 255, 255)) -> None:
+        super().__init__(count, xs, y, original_color, target_color)
+        self.amplitudes = np.zeros((2, count))
+        self.targets = np.zeros((2, count))
+        self.heights = np.zeros((2, count))
+        self.loudness = np.zeros(count)
+        self.correlation = 1.0
+
+    def update(self, amps, dt, min_height, max_height, correlation: float = 1.0):
+        """amps is (2, bars), left then right"""
+        self.compute_targets(amps, BarField.scale / 2)
+        np.max(self.amplitudes, axis=0, out=self.loudness)
+        self.color_indexes = (self.loudness * (BarField.lut_size - 1)).astype(np.intp)
+        self.colors = self.color_lut[self.color_indexes]
+        self.smooth(dt, min_height / 2, max_height / 2)
+        self.correlation = correlation
+
+    def spans(self):
+        left, right = self.heights
+        return (self.y - left, left + right)
+
+    def state(self):
+        return (*super().state(), self.correlation)
+
+    def bounds(self, width) -> pg.Rect | None:
+        rect = super().bounds(width)
+        # the correlation line sits on the baseline even when every bar is flat
+        return None if rect is None else rect.union((rect.left, int(self.y) - 1, rect.width, 3))
+
+    def draw(self, window, width):
+        y = self.y
+        left, right = self.heights
+        strips = self.get_strips(window, int(width))
+        if strips is not None:
+            draw_rounded_bars(window, strips, self.xs, y - left, int(width), left + right, self.color_indexes)
+        else:
+            for x, hl, hr, color in zip(self.xs.tolist(), left.tolist(), right.tolist(), self.colors.tolist()):
+                pg.draw.rect(window, color, (x, y - hl, width, hl + hr), border_radius=3)
+        if self.count:
+            t = min(max((1 - self.correlation) / 2, 0), 1)
+            color = fn.color_interpolation(self.original_color, StereoBarField.antiphase_color, t)
+            pg.draw.line(window, color, (self.xs[0], y), (self.xs[-1] + width, y))
+
+
+class SoundMeterField(BarField):
+    """SoundMeter style: BarField heights drawn as stacked cells with a falling peak-hold cell."""
 
-class SoundMeterBar:
     scale = 0
-    smoothing_scale = 0
     rect_height = 0
     rects_number = 0
     default_color_pallet = [(8, 126, 0), (127, 159, 8), (167, 147, 41), (182, 101, 0), (169, 1, 1)]
@@ -47,75 +252,110 @@ class SoundMeterBar:
     color_pallet_len = len(color_pallet)
     step = 0
     max_smooth_scale = 0.13
+    dims = None
+    # key -> (unlit strip, lit strip, peak cell), every bar has the same width so one set serves them all.
+    # A few geometries are kept so the control bar sliding back and forth rebuilds nothing
+    sprites = OrderedDict()
+    sprite_sets = 32
+    colorkey = (255, 0, 255)
 
     @staticmethod
     def calculate_class_dim(rect_height, scale, window_height):
-        SoundMeterBar.rect_height = rect_height
-        SoundMeterBar.rects_number = round(window_height / rect_height)
-        SoundMeterBar.scale = scale
-        SoundMeterBar.step = len(SoundMeterBar.color_pallet) / (SoundMeterBar.scale / SoundMeterBar.rect_height)
-
-    def __init__(self, frequency_index: tuple, pos) -> None:
-        self.pos = pos
-        self.frequency_index = frequency_index
-        self.height = 0
-        self.amplitude = 0
-        self.rects = 1
-        self.max = 0
-        self.temp = 0
+        if SoundMeterField.dims == (rect_height, scale, window_height):
+            return
+        SoundMeterField.dims = (rect_height, scale, window_height)
+        SoundMeterField.rect_height = rect_height
+        SoundMeterField.rects_number = round(window_height / rect_height)
+        SoundMeterField.scale = scale
+        SoundMeterField.step = len(SoundMeterField.color_pallet) / (SoundMeterField.scale / SoundMeterField.rect_height)
+
+    def __init__(self, count: int, xs, y) -> None:
+        super().__init__(count, xs, y)
+        self.peaks = np.zeros(self.count)
+        self.peaks_fall = np.zeros(self.count)
+        self.rects = np.ones(self.count, dtype=np.intp)
 
     def update(self, amps, dt, min_height, max_height):
-        if len(amps[self.frequency_index["index_range"][0] : self.frequency_index["index_range"][1]]) == 0:
-            self.amplitude = amps[self.frequency_index["index_range"][0]]
-        else:
-            self.amplitude = max(amps[self.frequency_index["index_range"][0] : self.frequency_index["index_range"][1]])
-        self.amplitude = fn.clamp(0, 1, self.amplitude)
-        target_height = int(self.amplitude * SoundMeterBar.scale)
-        self.height = fn.clamp(
-            min_height, max_height, self.height + (target_height - self.height) * dt * Bar.smoothing_scale
+        self.compute_targets(amps, SoundMeterField.scale)
+        self.smooth(dt, min_height, max_height)
+
+        self.peaks_fall += (self.peaks - SoundMeterField.rects_number) * (dt * SoundMeterField.max_smooth_scale)
+        falling = np.abs(self.peaks_fall) >= 1
+        self.peaks[falling] += self.peaks_fall[falling]
+        self.peaks_fall[falling] = 0
+        np.maximum(self.peaks, np.floor(self.heights / SoundMeterField.rect_height) + 2, out=self.peaks)
+        self.rects = np.ceil(self.heights / SoundMeterField.rect_height).astype(np.intp)
+
+    def state(self):
+        return (self.y, self.rects.tobytes(), self.peaks.tobytes(), SoundMeterField.dims)
+
+    def bounds(self, width) -> pg.Rect | None:
+        if not self.count:
+            return None
+        # above the highest lit or peak cell every column shows the same unlit cells, which only change with
+        # a resize, and that recomposes the whole window anyway
+        cells = min(max(int(self.rects.max()), float(self.peaks.max())), SoundMeterField.rects_number) + 1
+        top = int(self.y - SoundMeterField.rect_height * cells) - 1
+        left = int(self.xs[0])
+        right = int(np.ceil(self.xs[-1] + width)) + 1
+        return pg.Rect(left, top, right - left, int(self.y) + 2 - top)
+
+    @staticmethod
+    def build_sprites(width: int):
+        """column strips of all the cells, unlit and lit, laid out bottom up like the meter itself"""
+        rect_height = SoundMeterField.rect_height
+        n = SoundMeterField.rects_number
+        h = rect_height - 1
+        size = (width, int(np.ceil(rect_height * n)))
+        unlit, lit = pg.Surface(size), pg.Surface(size)
+        for strip in (unlit, lit):
+            strip.fill(SoundMeterField.colorkey)
+            strip.set_colorkey(SoundMeterField.colorkey, pg.RLEACCEL)
+        for i in range(1, n + 1):
+            rect = (0, rect_height * (n - i), width, h)
+            if i < n:
+                gfxdraw.box(unlit, rect, (0, 0, 0))
+            index = min(int(i * SoundMeterField.step), SoundMeterField.color_pallet_len - 1)
+            gfxdraw.box(lit, rect, SoundMeterField.color_pallet[index])
+            gfxdraw.rectangle(lit, rect, (0, 0, 0))
+        peak = pg.Surface((width, max(int(h), 1)))
+        peak.fill((25, 25, 25))
+        gfxdraw.rectangle(peak, (0, 0, width, h), (0, 0, 0))
+        return (unlit, lit, peak)
+
+    def get_sprites(self, width: int):
+        key = (
+            SoundMeterField.rect_height,
+            SoundMeterField.rects_number,
+            SoundMeterField.step,
+            width,
+            tuple(SoundMeterField.color_pallet),
         )
-        self.temp += (self.max - SoundMeterBar.rects_number) * dt * SoundMeterBar.max_smooth_scale
-        if abs(self.temp) >= 1:
-            self.max += self.temp
-            self.temp = 0
-        self.max = max(self.max, int(self.height / SoundMeterBar.rect_height) + 2)
-        # self.max += (self.max - SoundMeterBar.rects_number) * dt * SoundMeterBar.max_smooth_scale
-        self.rects = ceil(self.height / SoundMeterBar.rect_height)
+        sprites = SoundMeterField.sprites.get(key)
+        if sprites is not None:
+            SoundMeterField.sprites.move_to_end(key)
+            return sprites
+        sprites = SoundMeterField.build_sprites(width)
+        SoundMeterField.sprites[key] = sprites
+        if len(SoundMeterField.sprites) > SoundMeterField.sprite_sets:
+            SoundMeterField.sprites.popitem(last=False)
+        return sprites
 
     def draw(self, window, width):
-        x = self.pos[0]
-        y = self.pos[1] - (SoundMeterBar.rect_height * self.max)
-        h = SoundMeterBar.rect_height - 1
-        w = width
-        for i in range(1, SoundMeterBar.rects_number):
-            gfxdraw.box(
-                window,
-                (x, self.pos[1] - (SoundMeterBar.rect_height * i), w, h),
-                (0, 0, 0),
-            )
-        if self.max > 2:
-
-            gfxdraw.box(
-                window,
-                (x, y, w, h),
-                (25, 25, 25),
-            )
-            gfxdraw.rectangle(
-                window,
-                (x, y, w, h),
-                (0, 0, 0),
-            )
-        for i in range(1, self.rects + 1):
-            index = min(int((i) * SoundMeterBar.step), SoundMeterBar.color_pallet_len - 1)
-            color = SoundMeterBar.color_pallet[index]
-            rect = (x, self.pos[1] - (SoundMeterBar.rect_height * i), w, h)
-            gfxdraw.box(
-                window,
-                rect,
-                color,
-            )
-            gfxdraw.rectangle(
-                window,
-                rect,
-                (0, 0, 0),
-            )
+        """two clipped blits per bar, unlit cells above the level and lit ones below, plus the peak cell"""
+        width = int(width)
+        unlit, lit, peak_cell = self.get_sprites(width)
+        rect_height = SoundMeterField.rect_height
+        n = SoundMeterField.rects_number
+        strip_height = lit.get_height()
+        top = self.y - rect_height * n
+        blits = []
+        for x, peak, rects in zip(self.xs.tolist(), self.peaks.tolist(), self.rects.tolist()):
+            split = int(rect_height * (n - min(rects, n)))
+            if split > 0:
+                blits.append((unlit, (x, top), (0, 0, width, split)))
+            if split < strip_height:
+                blits.append((lit, (x, top + split), (0, split, width, strip_height - split)))
+            if peak > 2:
+                blits.append((peak_cell, (x, self.y - rect_height * peak)))
+        window.blits(blits, doreturn=False)
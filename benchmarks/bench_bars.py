@@ -0,0 +1,64 @@
+"""Frame time of the WhiteBars / MirroredStereo bars: one pg.draw.rect per bar vs draw_rounded_bars.
+
+run from the repository root with: python -m benchmarks.bench_bars"""
+
+import os, time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np, pygame as pg, globals as gp
+from bar import BarField, StereoBarField
+
+
+def make_field(field_class, size, count, spacing=2, seed=0):
+    """bars laid out like Application does, settled on a smooth spectrum-like random profile"""
+    width, height = size
+    bar_width = min(gp.min_bar_width, max(width / count, 2))
+    offset = (width - bar_width * count) // 2
+    xs = [i * bar_width + offset + spacing / 2 for i in range(count)]
+    field = field_class(count, xs, height / 2)
+    rng = np.random.default_rng(seed)
+    BarField.scale = 360 * min(width / gp.base_resolution[0], height / gp.base_resolution[1])
+    for _ in range(60):
+        shape = (2, count) if field_class is StereoBarField else (count,)
+        amps = np.convolve(rng.random(count + 8), np.ones(9) / 9, "valid")[:count] * np.linspace(1.2, 0.3, count)
+        field.update(np.broadcast_to(amps, shape) * rng.uniform(0.8, 1.0, shape), 1 / 60, int(height * 0.01), height)
+    return field, bar_width - spacing
+
+
+def time_draw(draw, window, width, repeat=200):
+    draw(window, width)
+    times = np.empty(repeat)
+    for i in range(repeat):
+        t = time.perf_counter()
+        draw(window, width)
+        times[i] = time.perf_counter() - t
+    return float(np.median(times))
+
+
+def main():
+    pg.init()
+    for size in ((1080, 600), (1920, 1080), (3840, 2160)):
+        window = pg.display.set_mode(size)
+        for field_class in (BarField, StereoBarField):
+            field, width = make_field(field_class, size, gp.bands_number)
+            painted = int((np.asarray(field.heights).reshape(-1, field.count).sum(axis=0) * int(width)).sum())
+            frames = []
+            results = []
+            for rasterize in (False, True):
+                BarField.rasterize = rasterize
+                window.fill((14, 29, 39))
+                field.draw(window, width)
+                frames.append(pg.surfarray.array2d(window))
+                results.append(time_draw(field.draw, window, width))
+            BarField.rasterize = True
+            same = "identical" if np.array_equal(frames[0], frames[1]) else "DIFFERENT"
+            print(
+                f"{size[0]}x{size[1]} {field_class.__name__:15s} {painted / 1000:7.0f}k px"
+                f"   per-bar rects {results[0] * 1000:6.2f} ms   draw_rounded_bars {results[1] * 1000:6.2f} ms"
+                f"   x{results[0] / results[1]:.1f}   pixels {same}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Seek latency (seek + first block) of plain soundfile vs the memory-mapped decoded-PCM cache.
+
+run from the repository root with: python -m benchmarks.bench_seek [files...]"""
+
+import sys, os, glob, time, tempfile, numpy as np, soundfile as sf, globals as gp
+from pcmcache import decode_to_pcm
+
+
+def percentile(values, p):
+    return float(np.percentile(np.asarray(values), p))
+
+
+def bench_file(filepath, seeks=50, block=gp.fft_size, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "track.pcm")
+        t = time.perf_counter()
+        decode_to_pcm(filepath, path)
+        decode_time = time.perf_counter() - t
+
+        with sf.SoundFile(filepath) as file:
+            frames = file.frames
+            channels = file.channels
+            sample_rate = file.samplerate
+            targets = np.random.default_rng(seed).integers(0, max(frames - block, 1), seeks)
+
+            soundfile_times = []
+            for target in targets:
+                t = time.perf_counter()
+                file.seek(int(target))
+                file.read(frames=block, dtype=gp.dtype, always_2d=True)
+                soundfile_times.append(time.perf_counter() - t)
+
+        pcm = np.memmap(path, dtype=np.int16, mode="r", shape=(frames, channels))
+        memmap_times = []
+        for target in targets:
+            t = time.perf_counter()
+            data = pcm[int(target) : int(target) + block]
+            data.sum()  # touch the pages, the callback hands them to the device
+            memmap_times.append(time.perf_counter() - t)
+        del pcm
+
+    print(f"{os.path.basename(filepath)}: {frames / sample_rate:.0f}s of audio, one-time decode {decode_time * 1000:.0f}ms")
+    for name, times in (("soundfile seek+read", soundfile_times), ("memmap slice", memmap_times)):
+        print(
+            f"  {name:20s} p50 {percentile(times, 50) * 1e6:9.1f} us   p99 {percentile(times, 99) * 1e6:9.1f} us"
+            f"   max {max(times) * 1e6:9.1f} us"
+        )
+
+
+def main(files):
+    for filepath in files:
+        bench_file(filepath)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob("assets/samples/*.mp3")))
@@ -0,0 +1,65 @@
+"""Time and memory per block of the spectrum path: the DSP the old callback_func ran vs SpectrumKernel.
+
+run from the repository root with: python -m benchmarks.bench_spectrum"""
+
+import time, tracemalloc, numpy as np, globals as gp
+from scipy.fft import fft
+from scipy.signal.windows import hann
+from analyzer import SpectrumKernel
+
+
+def legacy_spectrum(data, fft_size, window):
+    """the analysis part of callback_func before it moved to the analyzer thread"""
+    if len(data) < fft_size:
+        data = np.pad(data, ((0, fft_size - len(data)), (0, 0)), mode="constant")
+    mono_data = np.mean(data, axis=1) if len(data.shape) > 1 else data
+    ffted_chunk = fft(mono_data * window, norm="forward", n=fft_size)
+    amps = np.log10(np.abs(ffted_chunk) + 1e-6)
+    m = np.max(amps)
+    if m < 1e-6:
+        amps *= 0
+    else:
+        amps /= m
+    return amps
+
+
+def make_blocks(fft_size, channels=2, count=64, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(-(2**14), 2**14, (fft_size, channels), dtype=np.int16) for _ in range(count)]
+
+
+def measure(fn, blocks, repeat=10):
+    for block in blocks[:4]:
+        fn(block)
+    t = time.perf_counter()
+    for _ in range(repeat):
+        for block in blocks:
+            fn(block)
+    per_block = (time.perf_counter() - t) / (repeat * len(blocks))
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(blocks[0])
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return per_block, peak
+
+
+def main(fft_size=gp.fft_size):
+    window = hann(fft_size)
+    blocks = make_blocks(fft_size)
+    kernel = SpectrumKernel(fft_size, window)
+    out = np.zeros(kernel.bins, dtype=np.float32)
+
+    results = {
+        "callback_func (fft, float64)": measure(lambda b: legacy_spectrum(b, fft_size, window), blocks),
+        "SpectrumKernel (rfft, float32)": measure(lambda b: kernel.process(b, out), blocks),
+    }
+    print(f"fft_size={fft_size}, stereo int16 blocks")
+    for name, (per_block, peak) in results.items():
+        print(f"{name:32s} {per_block * 1e6:9.1f} us/block {peak / 1024:9.1f} KiB allocated/block")
+
+
+if __name__ == "__main__":
+    main()
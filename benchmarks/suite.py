@@ -0,0 +1,300 @@
+"""Per-call time and allocations of the audio, analysis and render hot paths, saved as JSON.
+
+Every path runs in isolation under the SDL dummy drivers with a headless AudioManager, so no window or
+audio device is needed. Sources are seeded synthetic tones and noise plus the bundled samples.
+
+run from the repository root with:
+    python -m benchmarks.suite -o before.json
+    python -m benchmarks.suite -o after.json --compare before.json"""
+
+import os, sys, time, json, glob, argparse, platform, tempfile, tracemalloc, subprocess
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np, soundfile as sf, pygame as pg, globals as gp
+from audio import AudioManager
+from bar import BarField, SoundMeterField
+
+
+def write_sources(directory: str, seconds: float = 30, seed: int = 0) -> dict:
+    """a -6 dBFS 1 kHz stereo tone at 44.1 kHz and white noise at 48 kHz, same bytes on every run"""
+    rng = np.random.default_rng(seed)
+    sources = {}
+    t = np.arange(int(seconds * 44100)) / 44100
+    tone = 0.5 * np.sin(2 * np.pi * 1000 * t)
+    sources["tone_44k"] = (np.stack((tone, tone), axis=1), 44100)
+    sources["noise_48k"] = (rng.uniform(-0.5, 0.5, (int(seconds * 48000), 2)), 48000)
+    paths = {}
+    for name, (data, sample_rate) in sources.items():
+        paths[name] = os.path.join(directory, name + ".wav")
+        sf.write(paths[name], data, sample_rate, subtype="PCM_16")
+    for filepath in sorted(glob.glob("assets/samples/*.mp3")):
+        paths[os.path.splitext(os.path.basename(filepath))[0]] = filepath
+    return paths
+
+
+def time_calls(fn, calls: int, warmup: int, between=None) -> np.ndarray:
+    """nanoseconds of every call, `between` runs untimed after each one"""
+    for _ in range(warmup):
+        fn()
+        if between is not None:
+            between()
+    times = np.empty(calls)
+    for i in range(calls):
+        t = time.perf_counter_ns()
+        fn()
+        times[i] = time.perf_counter_ns() - t
+        if between is not None:
+            between()
+    return times
+
+
+def allocations(fn, calls: int, between=None) -> dict:
+    """transient bytes allocated by a call (tracemalloc peak above the starting point) and blocks it
+    leaves behind, in a pass of its own since tracing slows everything down"""
+    peaks = np.empty(calls)
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    for i in range(calls):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        peaks[i] = tracemalloc.get_traced_memory()[1] - base
+        if between is not None:
+            between()
+    retained = (sys.getallocatedblocks() - blocks) / calls
+    tracemalloc.stop()
+    return {"alloc_bytes": float(np.median(peaks)), "retained_blocks": retained}
+
+
+def measure(fn, calls: int, warmup: int = 20, between=None) -> dict:
+    times = time_calls(fn, calls, warmup, between)
+    result = {
+        "calls": calls,
+        "p50_us": float(np.percentile(times, 50)) / 1000,
+        "p99_us": float(np.percentile(times, 99)) / 1000,
+        "mean_us": float(times.mean()) / 1000,
+    }
+    result.update(allocations(fn, max(calls // 10, 10), between))
+    return result
+
+
+def playing_manager(filepath: str, stereo: bool = False) -> AudioManager:
+    am = AudioManager(None, fft_size=gp.fft_size, bands_number=gp.bands_number, stereo=stereo, headless=True)
+    am.add([filepath])
+    am.update((1, 1))
+    return am
+
+
+def rewind_near_end(am: AudioManager):
+    if am.get_current_audio_pos() >= am.get_audio_duration() - 2:
+        am.set_pos(0)
+
+
+def prefill(am: AudioManager):
+    """headless readers decode on the callback's thread; topping the ring up untimed leaves the timed
+    callback only copying out of it, like the realtime path fed by the decoder thread"""
+    reader = am.current.reader
+    reader.fill(reader.capacity - reader.chunk)
+
+
+def bench_callback(filepath: str, calls: int) -> dict:
+    """callback_func alone, the analyzer drains the ring and the reader refills it untimed in between"""
+    am = playing_manager(filepath)
+
+    def between():
+        am.analyzer.step()
+        rewind_near_end(am)
+        prefill(am)
+
+    prefill(am)
+    try:
+        return measure(lambda: am.callback_func(None, am.frames_per_buffer, None, 0), calls, between=between)
+    finally:
+        am.terminate()
+
+
+def bench_decode(filepath: str, calls: int) -> dict:
+    """ReadAhead.decode_into, one read_ahead_chunk of frames decoded into the ring, which is what the
+    decoder thread does off the audio thread"""
+    am = playing_manager(filepath)
+    reader = am.current.reader
+    drain = np.empty((reader.chunk, reader.file.channels), dtype=gp.dtype)
+
+    def between():
+        reader.ring.read(drain)
+        if reader.eof:
+            reader.file.seek(0)
+            reader.eof = False
+
+    try:
+        return measure(lambda: reader.decode_into(reader.ring), calls, between=between)
+    finally:
+        am.terminate()
+
+
+def bench_analyzer(filepath: str, calls: int, stereo: bool = False) -> dict:
+    """one Analyzer.step per device block, the callback feeds it untimed in between"""
+    am = playing_manager(filepath, stereo)
+
+    def between():
+        am.callback_func(None, am.frames_per_buffer, None, 0)
+        rewind_near_end(am)
+
+    between()
+    try:
+        return measure(am.analyzer.step, calls, between=between)
+    finally:
+        am.terminate()
+
+
+def random_amps(count: int, frames: int = 64, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((frames, count), dtype=np.float32)
+
+
+def bench_bar_update(field_class, calls: int, count: int = gp.bands_number) -> dict:
+    field = field_class(count, np.arange(count) * 5.0, 300)
+    amps = random_amps(count)
+    state = {"i": 0}
+
+    def update():
+        field.update(amps[state["i"] % len(amps)], 1 / 60, 6, 600)
+        state["i"] += 1
+
+    return measure(update, calls)
+
+
+def bench_bar_draw(field_class, calls: int, count: int = gp.bands_number) -> dict:
+    window = pg.Surface(gp.base_resolution)
+    width = gp.base_resolution[0] / count
+    field = field_class(count, np.arange(count) * width, 300)
+    amps = random_amps(count)
+    state = {"i": 0}
+
+    def between():
+        field.update(amps[state["i"] % len(amps)], 1 / 60, 6, 600)
+        state["i"] += 1
+
+    between()
+    return measure(lambda: field.draw(window, max(width - 2, 1)), calls, between=between)
+
+
+def bench_application_draw(style, filepath: str, calls: int, size: tuple) -> dict:
+    """Application.draw of a playing track, pumping audio and updating untimed between frames"""
+    from main import Application
+
+    app = Application("assets/fonts/PixCon.ttf", 13, 60, size, False, "benchmark", style=style, headless=True)
+    app.resize(size)
+    app.dt = 1 / app.fps
+    app.am.add([filepath])
+
+    def between():
+        app.am.pump(app.dt)
+        app.update()
+        rewind_near_end(app.am)
+
+    for _ in range(30):
+        between()
+    try:
+        return measure(app.draw, calls, between=between)
+    finally:
+        app.scanner.shutdown()
+        app.am.terminate()
+
+
+def run(calls: int, size: tuple) -> dict:
+    from main import Styles, soundmeter_rect_height, soundmeter_scale_perc
+
+    pg.init()
+    pg.display.set_mode((1, 1))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        sources = write_sources(directory)
+        for name, filepath in sources.items():
+            results[f"callback_func[{name}]"] = bench_callback(filepath, calls)
+            results[f"ReadAhead.decode_into[{name}]"] = bench_decode(filepath, calls)
+            results[f"Analyzer.step[{name}]"] = bench_analyzer(filepath, calls)
+        results["Analyzer.step[noise_48k,stereo]"] = bench_analyzer(sources["noise_48k"], calls, stereo=True)
+
+        results["BarField.update"] = bench_bar_update(BarField, calls)
+        SoundMeterField.calculate_class_dim(soundmeter_rect_height, soundmeter_scale_perc, gp.base_resolution[1])
+        results["SoundMeterField.update"] = bench_bar_update(SoundMeterField, calls)
+        results["BarField.draw"] = bench_bar_draw(BarField, calls)
+        results["SoundMeterField.draw"] = bench_bar_draw(SoundMeterField, max(calls // 10, 20))
+
+        for style in (Styles.WhiteBars, Styles.SoundMeter, Styles.MirroredStereo):
+            frames = calls if style != Styles.SoundMeter else max(calls // 10, 20)
+            results[f"Application.draw[{style.name},{size[0]}x{size[1]}]"] = bench_application_draw(
+                style, sources["noise_48k"], frames, size
+            )
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pg.version.ver,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "fft_size": gp.fft_size,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """names whose p50 got slower than the baseline by more than `threshold` (0.1 = 10%)"""
+    regressions = []
+    print(f"\n{'':52s} {'p50 before':>11s} {'p50 after':>11s} {'change':>8s}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = result["p50_us"] / max(before["p50_us"], 1e-9) - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:52s} {before['p50_us']:9.1f}us {result['p50_us']:9.1f}us {change * 100:+7.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the audio, analysis and render hot paths")
+    parser.add_argument("-o", "--output", default=".cache/benchmarks.json")
+    parser.add_argument("--compare", help="earlier results to flag regressions against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown counted as a regression")
+    parser.add_argument("--calls", type=int, default=500, help="timed calls per path")
+    parser.add_argument("--size", default="1080x600", help="window size of the Application.draw runs")
+    args = parser.parse_args(argv)
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    results = run(args.calls, size)
+    print(f"\n{'':52s} {'p50':>10s} {'p99':>10s} {'alloc/call':>12s} {'retained':>9s}")
+    for name, result in results.items():
+        print(
+            f"{name:52s} {result['p50_us']:8.1f}us {result['p99_us']:8.1f}us"
+            f" {result['alloc_bytes'] / 1024:9.1f}KiB {result['retained_blocks']:9.2f}"
+        )
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=2)
+    print(f"saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold * 100:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
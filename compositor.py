@@ -0,0 +1,142 @@
+import pygame as pg
+
+
+class Layer:
+    """One plane of the frame, drawn in absolute window coordinates.
+
+    A cached layer keeps a window-sized surface that is only re-rendered when its signature changes (a
+    state change, a resize or an animation step all show up there); a live layer draws once per frame
+    it is recomposed, straight into the window when one dirty rect holds it, otherwise into its own
+    surface that is then blitted into each rect. Either way the rects it covered before and after a
+    change are reported dirty."""
+
+    def __init__(self, name: str, draw, signature, bounds, cached: bool = True, alpha: bool = True) -> None:
+        """draw(surface) renders the layer, signature() returns anything comparable that changes whenever
+        the rendering would, bounds() the pg.Rect it covers or None when it draws nothing"""
+        self.name = name
+        self.draw = draw
+        self.signature = signature
+        self.bounds = bounds
+        self.cached = cached
+        self.alpha = alpha
+        self.surface = None
+        self.last_signature = None
+        self.last_bounds = None
+        self.valid = False
+
+    def resize(self, window: pg.Surface):
+        if self.cached:
+            size = window.get_size()
+            self.surface = pg.Surface(size, pg.SRCALPHA) if self.alpha else pg.Surface(size, 0, window)
+        self.valid = False
+
+    def refresh(self, dirty: list):
+        signature = self.signature()
+        if self.valid and signature == self.last_signature:
+            return False
+        bounds = self.bounds()
+        for rect in (self.last_bounds, bounds):
+            if rect is not None:
+                dirty.append(pg.Rect(rect))
+        if self.cached:
+            if self.alpha:
+                self.surface.fill((0, 0, 0, 0))
+            self.draw(self.surface)
+        self.last_signature = signature
+        self.last_bounds = bounds
+        self.valid = True
+        return True
+
+    def compose(self, window: pg.Surface, rects: list):
+        if self.cached:
+            for rect in rects:
+                window.blit(self.surface, rect, rect)
+            return
+        if self.last_bounds is None:
+            return
+        rects = [rect for rect in rects if rect.colliderect(self.last_bounds)]
+        if len(rects) == 1:
+            window.set_clip(rects[0])
+            self.draw(window)
+            window.set_clip(None)
+        elif rects:
+            # drawing into the window clipped to the union would also paint pixels between the rects,
+            # where the layers above are not recomposed
+            if self.surface is None or self.surface.get_size() != window.get_size():
+                self.surface = pg.Surface(window.get_size(), pg.SRCALPHA)
+            self.surface.set_clip(rects[0].unionall(rects[1:]))
+            self.surface.fill((0, 0, 0, 0))
+            self.draw(self.surface)
+            for rect in rects:
+                window.blit(self.surface, rect, rect)
+
+
+def merge_rects(rects: list, bounds: pg.Rect) -> list:
+    """clips to the window and unites overlapping rects, so no pixel is composed or pushed twice"""
+    merged = []
+    for rect in rects:
+        rect = rect.clip(bounds)
+        if rect.width <= 0 or rect.height <= 0:
+            continue
+        # absorbing a rect can make the union overlap rects merged earlier, so go again until stable
+        while True:
+            index = rect.collidelist(merged)
+            if index == -1:
+                break
+            rect = rect.union(merged.pop(index))
+        merged.append(rect)
+    return merged
+
+
+class Compositor:
+    """Stacks layers bottom to top and recomposes only the rects some layer reported dirty, then pushes
+    just those to the display with pg.display.update. A frame where nothing changed costs the signature
+    checks and pushes nothing."""
+
+    def __init__(self, profiler=None) -> None:
+        self.layers = []
+        self.window = None
+        self.forced = []
+        self.pushed_pixels = 0
+        self.profiler = profiler
+
+    def add_layer(self, layer: Layer) -> Layer:
+        self.layers.append(layer)
+        if self.window is not None:
+            layer.resize(self.window)
+        return layer
+
+    def resize(self, window: pg.Surface):
+        """new window surface or size: every cached surface is rebuilt and the whole window recomposed"""
+        self.window = window
+        for layer in self.layers:
+            layer.resize(window)
+        self.invalidate()
+
+    def invalidate(self, rect: pg.Rect = None):
+        self.forced.append(self.window.get_rect() if rect is None else pg.Rect(rect))
+
+    def mark(self, name: str):
+        if self.profiler is not None:
+            self.profiler.mark(name)
+
+    def collect(self) -> list:
+        """re-renders the cached layers whose signature changed and returns the merged dirty rects"""
+        dirty = self.forced
+        self.forced = []
+        for layer in self.layers:
+            if layer.refresh(dirty) and layer.cached:
+                self.mark(layer.name)
+        rects = merge_rects(dirty, self.window.get_rect())
+        self.pushed_pixels = sum(rect.width * rect.height for rect in rects)
+        return rects
+
+    def compose(self, rects: list):
+        """layer by layer, the merged rects don't overlap so every pixel still stacks bottom to top"""
+        for layer in self.layers:
+            layer.compose(self.window, rects)
+            self.mark(layer.name)
+
+    def present(self, rects: list):
+        if rects:
+            pg.display.update(rects)
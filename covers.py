@@ -0,0 +1,125 @@
+import os, io, json, hashlib, numpy as np, pygame as pg
+from mutagen.id3 import ID3
+from concurrent.futures import ProcessPoolExecutor
+from diskcache import MemmapCache, write_meta
+
+
+def read_art(filepath: str, cover: tuple) -> bytes:
+    offset, length = cover
+    if offset < 0:
+        # the picture isn't stored verbatim (unsynchronised tag), take the bytes mutagen decodes
+        tags = ID3(filepath)
+        return next(tags[k].data for k in tags.keys() if "APIC" in k)
+    with open(filepath, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def make_thumbnails(filepath: str, cover: tuple, directory: str, size: int, smallest: int) -> str | None:
+    """runs in a worker process: hashes the embedded picture and, unless a track with the same art already
+    did it, decodes it once and writes a square RGBA mip chain from `size` down to `smallest`. Returns
+    the art key, None when the picture can't be decoded"""
+    data = read_art(filepath, cover)
+    key = hashlib.sha1(data).hexdigest()
+    path = os.path.join(directory, key + CoverCache.suffix)
+    if os.path.exists(path + ".json"):
+        os.utime(path)
+        return key
+    try:
+        decoded = pg.image.load(io.BytesIO(data))
+    except pg.error:
+        return None
+    # no display in the worker, so no convert_alpha; smoothscale needs 24 or 32 bit pixels
+    image = pg.Surface(decoded.get_size(), pg.SRCALPHA)
+    image.blit(decoded, (0, 0))
+    image = pg.transform.smoothscale(image, (size, size))
+    levels = []
+    while True:
+        levels.append(image)
+        if size // 2 < smallest:
+            break
+        size //= 2
+        image = pg.transform.smoothscale(image, (size, size))
+
+    offsets = []
+    tmp_path = path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for level in levels:
+            offsets.append([f.tell(), level.get_width()])
+            f.write(pg.image.tobytes(level, "RGBA"))
+    os.replace(tmp_path, path)
+    write_meta(path, shape=[offsets[-1][0] + levels[-1].get_width() ** 2 * 4], levels=offsets)
+    return key
+
+
+class CoverMips:
+    """square thumbnails of one cover, largest first, the only copy of the art kept in memory"""
+
+    def __init__(self, levels: list) -> None:
+        self.levels = levels
+
+    def level_for(self, size: int) -> pg.Surface:
+        """smallest thumbnail at least `size` wide, so scaling it down never magnifies"""
+        for level in reversed(self.levels):
+            if level.get_width() >= size:
+                return level
+        return self.levels[0]
+
+
+class CoverCache(MemmapCache):
+    """Cover thumbnails decoded and downscaled in a worker process and kept on disk keyed by the hash of
+    the art bytes, so an album cover shared by every track of the album is decoded once for the whole
+    library. Per track only the mapping to that hash is kept, in memory."""
+
+    suffix = ".rgba"
+
+    def __init__(self, directory: str, max_bytes: int, size: int, smallest: int, workers: int = 1) -> None:
+        super().__init__(directory, max_bytes, make_thumbnails, f"{size}/{smallest}", workers)
+        self.size = size
+        self.smallest = smallest
+        self.art_keys = {}  # track key -> art key, None when the track's art can't be decoded
+
+    def request(self, filepath: str, cover: tuple):
+        """cover is the (offset, length) of the embedded picture the probe found, offset -1 when only
+        mutagen can decode it"""
+        key = self.key(filepath)
+        if key is None or key in self.pending or key in self.art_keys or key in self.failed:
+            return
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        future = self.pool.submit(self.job, filepath, cover, self.directory, self.size, self.smallest)
+        future.add_done_callback(lambda f: self.evict())
+        self.pending[key] = future
+
+    def get(self, filepath: str, wait: bool = False) -> CoverMips | None:
+        """None until the worker is done, or when the track has no usable art; cheap to poll every frame.
+        Every call that finds them loads the thumbnails from disk again, keep what it returns"""
+        key = self.key(filepath)
+        future = self.pending.get(key)
+        if future is not None:
+            if not wait and not future.done():
+                return None
+            del self.pending[key]
+            if future.exception() is not None:
+                print(f"{type(self).__name__}: thumbnails failed: {future.exception()}")
+                self.failed.add(key)
+                return None
+            self.art_keys[key] = future.result()
+        art_key = self.art_keys.get(key)
+        if art_key is None:
+            return None
+        path = self.path(art_key)
+        try:
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            data = np.fromfile(path, dtype=np.uint8)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # evicted since, make it again on the next request
+            del self.art_keys[key]
+            return None
+        levels = []
+        for offset, size in meta["levels"]:
+            raw = data[offset : offset + size * size * 4].tobytes()
+            levels.append(pg.image.frombytes(raw, (size, size), "RGBA").convert_alpha())
+        return CoverMips(levels)
@@ -0,0 +1,115 @@
+import threading, time, numpy as np, soundfile as sf, globals as gp
+from utilities.RingBuffer import RingBuffer
+
+
+class ReadAhead:
+    """Decodes a SoundFile on its own thread into a bounded PCM ring so the audio callback never
+    touches the disk or the decoder.
+
+    The callback is the ring's only consumer and the decoder thread its only producer. A seek is a
+    request the decoder thread carries out by prefilling a fresh ring from the new position and then
+    swapping it in, so stale frames are dropped without the callback waiting for a refill.
+
+    A synchronous reader starts no thread: read() seeks and decodes on the caller's thread, for
+    headless rendering where nothing runs in real time."""
+
+    def __init__(
+        self,
+        file: sf.SoundFile,
+        seconds: float = gp.read_ahead_seconds,
+        chunk: int = gp.read_ahead_chunk,
+        synchronous: bool = False,
+    ):
+        self.file = file
+        self.synchronous = synchronous
+        self.chunk = chunk
+        self.capacity = max(int(seconds * file.samplerate), chunk * 2)
+        self.ring = RingBuffer(self.capacity, file.channels, gp.dtype)
+        self.scratch = np.zeros((chunk, file.channels), dtype=gp.dtype)
+        self.low_watermark = self.ring.capacity // 4
+        self.seek_target = None
+        self.eof = False
+        self.running = False
+        self.thread = None
+        self.poll_interval = 0.005
+        # written by the callback only
+        self.stalls = 0
+        self.low_watermark_events = 0
+        self.below_watermark = False
+
+    def start(self):
+        if self.synchronous or self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def seek(self, frame: int):
+        """any thread; the decoder thread performs it"""
+        self.seek_target = frame
+
+    def decode_into(self, ring: RingBuffer):
+        read = self.file.read(frames=self.chunk, dtype=gp.dtype, always_2d=True, out=self.scratch)
+        ring.write(read)
+        if len(read) < self.chunk:
+            self.eof = True
+
+    def apply_seek(self):
+        target, self.seek_target = self.seek_target, None
+        self.file.seek(target)
+        self.eof = False
+        ring = RingBuffer(self.capacity, self.file.channels, gp.dtype)
+        self.decode_into(ring)
+        # the callback picks the new ring up on its next read, the old one is dropped unread
+        self.ring = ring
+
+    def run(self):
+        while self.running:
+            if self.seek_target is not None:
+                self.apply_seek()
+                continue
+            if self.eof or self.ring.available_write() < self.chunk:
+                time.sleep(self.poll_interval)
+                continue
+            self.decode_into(self.ring)
+
+    def fill(self, frames: int):
+        """synchronous mode: decodes on the caller's thread until `frames` are buffered"""
+        if self.seek_target is not None:
+            self.apply_seek()
+        while not self.eof and self.ring.available_read() < frames and self.ring.available_write() >= self.chunk:
+            self.decode_into(self.ring)
+
+    def read(self, out: np.ndarray) -> int:
+        """audio thread: copies up to len(out) frames, returns how many were available"""
+        if self.synchronous:
+            self.fill(len(out))
+        ring = self.ring
+        n = ring.read(out)
+        finished = self.eof and ring.available_read() == 0
+        if n < len(out) and not finished:
+            self.stalls += 1
+        if not self.eof and ring.available_read() < self.low_watermark:
+            if not self.below_watermark:
+                self.low_watermark_events += 1
+                self.below_watermark = True
+        else:
+            self.below_watermark = False
+        return n
+
+    def finished(self) -> bool:
+        return self.eof and self.ring.available_read() == 0 and self.seek_target is None
+
+    def get_stats(self):
+        return {
+            "buffered": self.ring.available_read() / self.file.samplerate,
+            "capacity": self.ring.capacity / self.file.samplerate,
+            "stalls": self.stalls,
+            "low_watermark_events": self.low_watermark_events,
+        }
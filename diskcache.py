@@ -0,0 +1,115 @@
+import os, json, hashlib, numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+
+class MemmapCache:
+    """Per-track arrays computed in a process pool and kept on disk as raw memory-mappable files.
+
+    `job(filepath, path, *args)` runs in a worker, writes the raw array to `path` and its metadata,
+    including "shape", to `path`.json. Entries are keyed by file path, mtime and `params`; the
+    directory is kept under max_bytes by dropping the least recently used entries (file mtime is
+    bumped on every use)."""
+
+    suffix = ".bin"
+    dtype = np.uint8
+
+    def __init__(self, directory: str, max_bytes: int, job, params: str = "", workers: int = 1) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.job = job
+        self.params = params
+        self.workers = workers
+        self.pool = None
+        self.keys = {}
+        self.pending = {}
+        self.ready = set()
+        self.failed = set()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, filepath: str, params: str = ""):
+        memo = (filepath, params)
+        if memo not in self.keys:
+            try:
+                mtime = os.path.getmtime(filepath)
+            except OSError:
+                return None
+            raw = f"{os.path.abspath(filepath)}|{mtime}|{self.params}|{params}"
+            self.keys[memo] = hashlib.sha1(raw.encode()).hexdigest()
+        return self.keys[memo]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def request(self, filepath: str, *args, params: str = ""):
+        key = self.key(filepath, params)
+        if key is None or key in self.pending or key in self.failed:
+            return
+        if os.path.exists(self.path(key) + ".json"):
+            self.ready.add(key)
+            return
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        future = self.pool.submit(self.job, filepath, self.path(key), *args)
+        future.add_done_callback(lambda f: self.evict())
+        self.pending[key] = future
+
+    def get(self, filepath: str, params: str = ""):
+        """(memmap, metadata) or None; cheap enough to poll every frame, no filesystem access until
+        the entry is known to be ready"""
+        key = self.key(filepath, params)
+        future = self.pending.get(key)
+        if future is not None:
+            if not future.done():
+                return None
+            del self.pending[key]
+            if future.exception() is not None:
+                print(f"{type(self).__name__}: precomputation failed: {future.exception()}")
+                self.failed.add(key)
+                return None
+            self.ready.add(key)
+        if key not in self.ready:
+            return None
+        path = self.path(key)
+        try:
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            array = np.memmap(path, dtype=self.dtype, mode="r", shape=tuple(meta["shape"]))
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.ready.discard(key)
+            return None
+        return (array, meta)
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    pass
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # still mapped by the playing track on platforms that lock open files
+                continue
+            total -= size
+            try:
+                os.remove(path + ".json")
+            except OSError:
+                pass
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+def write_meta(path: str, **meta):
+    with open(path + ".json", "w") as f:
+        json.dump(meta, f)
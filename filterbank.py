@@ -0,0 +1,114 @@
+import numpy as np, globals as gp
+
+SCALES = ("log", "mel", "bark")
+POOLINGS = ("max", "triangular")
+
+
+def hz_to_scale(f, scale: str):
+    f = np.asarray(f, dtype=np.float64)
+    if scale == "mel":
+        return 2595 * np.log10(1 + f / 700)
+    if scale == "bark":
+        # Traunmüller's approximation, invertible in closed form
+        return 26.81 * f / (1960 + f) - 0.53
+    return np.log(np.maximum(f, 1e-9))
+
+
+def scale_to_hz(z, scale: str):
+    z = np.asarray(z, dtype=np.float64)
+    if scale == "mel":
+        return 700 * (10 ** (z / 2595) - 1)
+    if scale == "bark":
+        return 1960 * (z + 0.53) / (26.28 - z)
+    return np.exp(z)
+
+
+def dense_edges(sample_rate: int, fft_size: int):
+    """the original layout: one band per distinct bin of a 1 Hz * 1.06^k sweep up to nyquist"""
+    usable_range = fft_size // 2
+    indexes = []
+    frequency = 1
+    while True:
+        index = int(frequency * fft_size / sample_rate)
+        if index > usable_range:
+            break
+        indexes.append(index)
+        frequency *= 1.06
+    starts = np.array(sorted(set(indexes)), dtype=np.intp)
+    return np.append(starts, starts[-1] + 1) * sample_rate / fft_size
+
+
+class Filterbank:
+    """Reduces one spectrum of fft_size // 2 + 1 bins to `count` bands in a single vectorised op.
+
+    Band edges are laid out on the log, mel or bark scale between gp.start_frequency and
+    gp.end_frequency (capped at nyquist) and mapped to bins with the track's real sample rate. "max"
+    pooling keeps the loudest bin of every band with one reduceat over precomputed starts,
+    "triangular" is one matrix product with overlapping unit-area triangles. With bands=None the
+    original dense layout is used and the count depends on the sample rate.
+
+    Instances are immutable and shared, get them through get_filterbank()."""
+
+    def __init__(self, sample_rate: int, fft_size: int, bands: int = None, scale: str = "log", pooling: str = "max"):
+        if scale not in SCALES:
+            raise ValueError(f"unknown band scale {scale!r}, expected one of {SCALES}")
+        if pooling not in POOLINGS:
+            raise ValueError(f"unknown band pooling {pooling!r}, expected one of {POOLINGS}")
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.bands = bands
+        self.scale = scale
+        self.pooling = pooling
+        self.bins = fft_size // 2 + 1
+        nyquist = sample_rate / 2
+
+        if bands is None:
+            edges = dense_edges(sample_rate, fft_size)
+        else:
+            low = hz_to_scale(gp.start_frequency, scale)
+            high = hz_to_scale(min(gp.end_frequency, nyquist), scale)
+            edges = scale_to_hz(np.linspace(low, high, bands + 1), scale)
+        self.edges = edges
+        self.frequencies = (edges[:-1] + edges[1:]) / 2
+        self.count = len(edges) - 1
+
+        bin_width = sample_rate / fft_size
+        # every band reads at least the bin its lower edge falls in, narrow low bands may share one
+        self.starts = np.minimum((edges[:-1] / bin_width + 1e-9).astype(np.intp), self.bins - 1)
+        self.reduce_len = int(min(max(edges[-1] / bin_width, self.starts[-1] + 1), self.bins))
+        # stored transposed so (..., bins) @ matrix reduces any number of channels in one product
+        self.matrix = self.build_triangles(bin_width).T.copy() if pooling == "triangular" else None
+
+    def build_triangles(self, bin_width: float) -> np.ndarray:
+        centers = self.frequencies
+        lows = np.concatenate(([self.edges[0]], centers[:-1]))
+        highs = np.concatenate((centers[1:], [self.edges[-1]]))
+        f = np.arange(self.bins) * bin_width
+        rising = (f[None, :] - lows[:, None]) / np.maximum(centers - lows, 1e-9)[:, None]
+        falling = (highs[:, None] - f[None, :]) / np.maximum(highs - centers, 1e-9)[:, None]
+        weights = np.clip(np.minimum(rising, falling), 0, None)
+        # bands narrower than a bin would catch nothing, they take their nearest bin instead
+        empty = weights.sum(axis=1) == 0
+        nearest = np.minimum(np.rint(centers / bin_width).astype(np.intp), self.bins - 1)
+        weights[empty, nearest[empty]] = 1
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.ascontiguousarray(weights, dtype=np.float32)
+
+    def reduce(self, spectrum: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """spectrum is float32 (..., bins), out a float32 array of shape (..., count)"""
+        if self.matrix is not None:
+            return np.dot(spectrum, self.matrix, out=out)
+        return np.maximum.reduceat(spectrum[..., : self.reduce_len], self.starts, axis=-1, out=out)
+
+
+filterbanks = {}
+
+
+def get_filterbank(
+    sample_rate: int, fft_size: int, bands: int = None, scale: str = gp.band_scale, pooling: str = gp.band_pooling
+) -> Filterbank:
+    key = (sample_rate, fft_size, bands, scale, pooling)
+    filterbank = filterbanks.get(key)
+    if filterbank is None:
+        filterbank = filterbanks[key] = Filterbank(sample_rate, fft_size, bands, scale, pooling)
+    return filterbank
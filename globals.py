@@ -8,8 +8,48 @@ bands_number = 199
 bar_color = (64, 79, 89)
 start_frequency = 20
 end_frequency = 20000
+band_scale = "log"  # log, mel or bark spacing of the bars
+band_pooling = "max"  # max or triangular reduction of the bins inside a bar
+loudness_meter = True  # EBU R128 loudness and true peak, measured on the analyzer thread
 min_bar_width = 50
 dtype = "int16"
+ring_buffer_blocks = 8
+# low latency mode: small device buffer, analysis window stays fft_size and advances every hop_size frames
+low_latency = False
+low_latency_frames_per_buffer = 256
+low_latency_hop_size = 256
+spectrogram_cache_dir = ".cache/spectrograms"
+spectrogram_cache_size = 256 * 2**20  # bytes
+library_index_path = ".cache/library.sqlite3"
+scanner_workers = 4
+files_added_per_frame = 256
+read_ahead_seconds = 2  # decoded PCM kept ahead of the callback
+read_ahead_chunk = 4096  # frames decoded per read
+# decode tracks once into raw PCM files and play them from a memmap: O(1) seeks, zero-copy callback
+pcm_cache = False
+pcm_cache_dir = ".cache/pcm"
+pcm_cache_size = 2 * 2**30  # bytes
+waveform_cache_dir = ".cache/peaks"
+waveform_cache_size = 64 * 2**20  # bytes
+waveform_base_decimation = 256  # frames per bin of the finest waveform level
+cover_cache_dir = ".cache/covers"
+cover_cache_size = 64 * 2**20  # bytes
+cover_thumbnail_size = 512  # largest thumbnail kept of every cover, halved down to cover_thumbnail_min
+cover_thumbnail_min = 64
+preload_tracks = 2  # upcoming tracks opened and decoded in the background
+spectrogram_lookahead = 2  # tracks after the current one to precompute
+# per callback duration, PortAudio status flags, DAC time jitter and silent callbacks, aggregated off the audio thread
+audio_telemetry = True
+audio_telemetry_interval = 1.0  # seconds between aggregations
+audio_telemetry_path = None  # .jsonl file getting one line per interval, None to keep it in memory only
+profiler_overlay = False  # per stage frame timings, toggled with F3
+text_cache_size = 256  # rendered text surfaces kept, least recently used dropped first
+marquee_speed = 40  # pixels per second at base_resolution, titles too long for the song info box scroll
+marquee_pause = 1.5  # seconds the start of a scrolling title is held every loop
+font_cache_size = 8  # font sizes kept loaded, so resizing back to an earlier size loads nothing
+scaled_asset_cache_size = 48  # scaled icons and covers kept, least recently used dropped first
+resize_settle = 0.25  # seconds without a resize event before the window is rebuilt at full quality
+profiler_dump = None  # path of a .csv or .jsonl file getting one row per frame, None to disable
 WIDTH = 1080
 HEIGHT = 600
 
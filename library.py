@@ -0,0 +1,96 @@
+import os, sqlite3, threading
+
+
+class LibraryIndex:
+    """Probe results of every known file in a local SQLite database.
+
+    A row is only trusted while the file's mtime and size still match, so re-adding an unchanged
+    file costs one stat and one lookup instead of opening the container."""
+
+    columns = (
+        "format",
+        "duration",
+        "sample_rate",
+        "channels",
+        "title",
+        "artist",
+        "album",
+        "date",
+        "genre",
+        "bpm",
+        "cover_offset",
+        "cover_length",
+    )
+    tags = ("title", "artist", "album", "date", "genre", "bpm")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tracks (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, "
+            + ", ".join(self.columns)
+            + ")"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def stat(filepath: str):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def lookup(self, filepath: str, stat: tuple = None) -> dict | None:
+        stat = LibraryIndex.stat(filepath) if stat is None else stat
+        if stat is None:
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT {', '.join(self.columns)} FROM tracks WHERE path = ? AND mtime = ? AND size = ?",
+                (os.path.abspath(filepath), stat[0], stat[1]),
+            ).fetchone()
+        if row is None:
+            return None
+        values = dict(zip(self.columns, row))
+        return {
+            "format": values["format"],
+            "duration": values["duration"],
+            "sample_rate": values["sample_rate"],
+            "channels": values["channels"],
+            "tags": {k: values[k] for k in self.tags},
+            "cover": None if values["cover_offset"] is None else (values["cover_offset"], values["cover_length"]),
+        }
+
+    def store(self, filepath: str, info: dict, stat: tuple = None, commit: bool = True):
+        stat = LibraryIndex.stat(filepath) if stat is None else stat
+        if stat is None:
+            return
+        cover = info["cover"] or (None, None)
+        row = (
+            os.path.abspath(filepath),
+            stat[0],
+            stat[1],
+            info["format"],
+            info["duration"],
+            info["sample_rate"],
+            info["channels"],
+            *(info["tags"].get(k) for k in self.tags),
+            cover[0],
+            cover[1],
+        )
+        with self.lock:
+            self.connection.execute(f"INSERT OR REPLACE INTO tracks VALUES ({', '.join('?' * len(row))})", row)
+            if commit:
+                self.connection.commit()
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
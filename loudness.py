@@ -0,0 +1,155 @@
+import math, numpy as np
+from scipy.signal import sosfilt, firwin
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def k_weighting(sample_rate: int) -> np.ndarray:
+    """BS.1770 pre-filter (high shelf) and RLB high-pass as second order sections for any rate,
+    the same derivation libebur128 uses so 48 kHz gives the coefficients printed in the standard"""
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        1,
+        2 * (k * k - 1) / a0,
+        (1 - k / q + k * k) / a0,
+    ]
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    high_pass = [1, -2, 1, 1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, high_pass])
+
+
+def channel_weights(channels: int) -> np.ndarray:
+    """BS.1770 weights, 5.1 is taken as L R C LFE Ls Rs with the LFE left out"""
+    if channels == 6:
+        return np.array([1, 1, 1, 0, 1.41, 1.41])
+    weights = np.ones(channels)
+    if channels == 5:
+        weights[3:] = 1.41
+    return weights
+
+
+def to_lufs(energy: float) -> float:
+    return -0.691 + 10 * math.log10(energy) if energy > 0 else float("-inf")
+
+
+class LoudnessMeter:
+    """Streaming EBU R128 loudness and true peak of int16 PCM, fed block by block.
+
+    The K-weighting filter state is carried between blocks and the weighted signal is only kept as
+    per channel energy sums of 100 ms steps: momentary (400 ms) and short-term (3 s) read the last 4
+    and 30 steps, and every 400 ms gating block lands in a histogram of 0.1 LU bins, so the gated
+    integrated loudness never revisits audio. True peak comes from a 4x polyphase interpolator with
+    its own carried history. All of it is a fixed amount of work per frame."""
+
+    absolute_gate = -70.0
+    relative_gate = -10.0
+    histogram_step = 0.1
+    histogram_bins = 1000  # -70 LUFS .. +30 LUFS
+    oversampling = 4
+    taps_per_phase = 12
+
+    def __init__(self, sample_rate: int, channels: int) -> None:
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sos = k_weighting(sample_rate)
+        self.weights = channel_weights(channels)
+        self.step_frames = sample_rate // 10
+        taps = firwin(self.oversampling * self.taps_per_phase, 1 / self.oversampling, window=("kaiser", 8.0))
+        # phase p of output frame n is sum_k taps[p + 4k] * x[n - k]; reversed so a sliding window
+        # over the oldest-first history lines up with it
+        self.phases = np.ascontiguousarray((taps * self.oversampling).reshape(-1, self.oversampling)[::-1])
+        # no interpolated value can exceed the largest input sample by more than this
+        self.phase_gain = float(np.abs(self.phases).sum(axis=0).max())
+        self.reset()
+
+    def reset(self):
+        """forgets everything measured so far, the next block starts a new programme"""
+        self.zi = np.zeros((len(self.sos), 2, self.channels))
+        self.step_energy = 0.0
+        self.step_filled = 0
+        self.steps = np.zeros(30)
+        self.steps_seen = 0
+        self.histogram_counts = np.zeros(LoudnessMeter.histogram_bins, dtype=np.int64)
+        self.histogram_energy = np.zeros(LoudnessMeter.histogram_bins)
+        self.peak_history = np.zeros((self.taps_per_phase - 1, self.channels))
+        self.true_peak = 0.0
+        self.momentary = float("-inf")
+        self.short_term = float("-inf")
+
+    def process(self, block: np.ndarray):
+        """block is (frames, channels) int16 PCM in playback order"""
+        if len(block) == 0:
+            return
+        x = block * (1 / 32768)
+        self.measure_true_peak(x)
+        weighted, self.zi = sosfilt(self.sos, x, axis=0, zi=self.zi)
+        weighted *= weighted
+        energy = weighted @ self.weights
+        start = 0
+        while start < len(energy):
+            take = min(self.step_frames - self.step_filled, len(energy) - start)
+            self.step_energy += energy[start : start + take].sum()
+            self.step_filled += take
+            start += take
+            if self.step_filled == self.step_frames:
+                self.finish_step(self.step_energy / self.step_frames)
+                self.step_energy = 0.0
+                self.step_filled = 0
+
+    def finish_step(self, energy: float):
+        self.steps[self.steps_seen % len(self.steps)] = energy
+        self.steps_seen += 1
+        if self.steps_seen < 4:
+            return
+        ends = [(self.steps_seen - i) % len(self.steps) for i in range(1, 5)]
+        block_energy = self.steps[ends].mean()
+        self.momentary = to_lufs(block_energy)
+        if self.steps_seen >= len(self.steps):
+            self.short_term = to_lufs(self.steps.mean())
+        if self.momentary >= LoudnessMeter.absolute_gate:
+            index = int((self.momentary - LoudnessMeter.absolute_gate) / LoudnessMeter.histogram_step)
+            index = min(index, LoudnessMeter.histogram_bins - 1)
+            self.histogram_counts[index] += 1
+            self.histogram_energy[index] += block_energy
+
+    def measure_true_peak(self, x: np.ndarray):
+        extended = np.concatenate((self.peak_history, x))
+        self.peak_history = extended[-(self.taps_per_phase - 1) :]
+        sample_peak = float(np.abs(x).max())
+        self.true_peak = max(self.true_peak, sample_peak)
+        # blocks that can not raise the reading skip the interpolation
+        if sample_peak * self.phase_gain <= self.true_peak:
+            return
+        for channel in extended.T.copy():
+            windows = sliding_window_view(channel, self.taps_per_phase)
+            self.true_peak = max(self.true_peak, float(np.abs(windows @ self.phases).max()))
+
+    def integrated(self) -> float:
+        """gated loudness of everything since the last reset, O(histogram bins)"""
+        counts, energy = self.histogram_counts, self.histogram_energy
+        total = counts.sum()
+        if total == 0:
+            return float("-inf")
+        threshold = to_lufs(energy.sum() / total) + LoudnessMeter.relative_gate
+        first = max(int(math.ceil((threshold - LoudnessMeter.absolute_gate) / LoudnessMeter.histogram_step)), 0)
+        gated = counts[first:].sum()
+        if gated == 0:
+            return float("-inf")
+        return to_lufs(energy[first:].sum() / gated)
+
+    def get_readings(self) -> dict:
+        """LUFS values are -inf until enough audio was measured, true peak is in dBTP"""
+        return {
+            "momentary": self.momentary,
+            "short_term": self.short_term,
+            "integrated": self.integrated(),
+            "true_peak": 20 * math.log10(self.true_peak) if self.true_peak > 0 else float("-inf"),
+        }
@@ -1,10 +1,16 @@
-import sys, threading, time, enum
+import sys, time, enum, multiprocessing
+from collections import OrderedDict
 import pygame as pg
 import globals as gp
 import m_platform as pf
 from audio import AudioManager, AudioFile
-from bar import Bar, SoundMeterBar
+from profiler import FrameProfiler
+from compositor import Compositor, Layer
+from scanner import LibraryScanner
+from bar import BarField, StereoBarField, SoundMeterField
 from utilities.Buttons import ToggleButtons, ButtonTemplate
+from utilities.TextCache import text_cache, Marquee
+from utilities.ScaleCache import scale_cache
 import utilities.Slider as sl
 
 
@@ -42,6 +48,7 @@ soundmeter_rect_height = 15
 soundmeter_scale_perc = 480
 soundmeter_bars_upper_pos = 412
 soundmeter_bars_target_pos = 600
+soundmeter_height_step = 8  # px the meter height snaps to while the control bar slides
 
 
 smoothing_speed = 5
@@ -64,6 +71,7 @@ class Styles(enum.Enum):
     WhiteBars = "WhiteBars"
     MinimalistSoundMeter = "MinimalistSoundMeter"
     SoundMeter = "MinimalistSoundMeter"
+    MirroredStereo = "MirroredStereo"
 
 
 class Application:
@@ -81,8 +89,10 @@ class Application:
         min_size: tuple = [100, 100],
         style=Styles.WhiteBars,
         spacing: int = 2,
+        headless: bool = False,
     ):
         self.bar_spacing = spacing
+        self.headless = headless
         pg.init()
         self.style = style
         self.fps = fps
@@ -111,18 +121,25 @@ class Application:
             "NoImage": pg.image.load("assets/images/no_image.png"),
         }
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler(
+            fps,
+            ("events", "update", "bar_update", "background", "chrome", "bars", "loading", "text", "overlay", "flip"),
+            visible=gp.profiler_overlay,
+            dump_path=gp.profiler_dump,
+        )
 
-        self.am = AudioManager(self, fft_size=gp.fft_size, bands_number=gp.bands_number)
-        self.files_queue = []
+        self.am = AudioManager(
+            self,
+            fft_size=gp.fft_size,
+            bands_number=gp.bands_number,
+            stereo=self.style == Styles.MirroredStereo,
+            headless=headless,
+        )
+        self.scanner = LibraryScanner(self.am.library, gp.scanner_workers)
         self.temp_queue = []
 
         self.preview_img = None
 
-        self.display_loading_lock = threading.Lock()
-        self.reading_from_queue_lock = threading.Lock()
-        self.audio_loader_thread = threading.Thread(target=self.add_file)
-        self.audio_loader_thread.daemon = True
-        self.audio_loader_thread.start()
         self.images[AudioManager.PREV_AVAILABLE] = pg.transform.flip(self.images[AudioManager.NEXT_AVAILABLE], True, False)
         self.images[AudioManager.START_OF_LIST] = pg.transform.flip(self.images[AudioManager.END_OF_LIST], True, False)
 
@@ -133,6 +150,14 @@ class Application:
         self.font_size = int(self.base_font_size * self.min_scale)
         self.font_path = font_path
 
+        text_cache.capacity = gp.text_cache_size
+        scale_cache.capacity = gp.scaled_asset_cache_size
+        self.fonts = OrderedDict()  # (path, size) -> (font, small_font)
+        self.pending_size = None  # last VIDEORESIZE of the frame, applied once after the event loop
+        self.draft = False  # laid out with nearest neighbour scaling while the window is being dragged
+        self.last_resize = 0
+        self.title_marquee = Marquee(pause=gp.marquee_pause)
+        self.artist_marquee = Marquee(pause=gp.marquee_pause)
         self.init_font(font_size, font_path)
 
         self.bar_min_height = int(self.height * 0.01)
@@ -175,46 +200,44 @@ class Application:
         self.show_settings_bar = False
         self.running = True
         self.rendered_text = {"title": None, "artist_name": None}
+        self.compositor = Compositor(self.profiler)
+        self.init_layers()
+        self.compositor.resize(self.window)
 
     def init_bars(self, style, bars_number: int = None):
         if style == Styles.SoundMeter and bars_number == None:
             bars_number = 31
-        dic = self.am.get_usable_freq(bars_number)
-        frequencies = dic["frequencies"]
-        self.indexes = dic["indexes"]
-        l = len(self.indexes) - 1
-
-        self.bar_width = min(gp.min_bar_width, max(self.width / (l + 1), 2))
-
-        offset = (self.width - self.bar_width * (l + 1)) // 2
-        self.bars = (
-            [
-                Bar(
-                    {
-                        "frequencies": (frequencies[self.indexes[i] : self.indexes[min(i + 1, l)]]),
-                        "index_range": (self.indexes[i], self.indexes[min(i + 1, l)]),
-                    },
-                    (i * self.bar_width + offset + self.bar_spacing / 2, self.height),
-                    gp.bar_color,
-                    (225, 241, 245),
-                )
-                for i in range(len(self.indexes))
-            ]
-            if style == Styles.WhiteBars
-            else [
-                SoundMeterBar(
-                    {
-                        "frequencies": (frequencies[self.indexes[i] : self.indexes[min(i + 1, l)]]),
-                        "index_range": (self.indexes[i], self.indexes[min(i + 1, l)]),
-                    },
-                    (i * self.bar_width + offset + self.bar_spacing / 2, self.height),
-                )
-                for i in range(len(self.indexes))
-            ]
-        )
+        self.filterbank = self.am.set_bands(bars_number)
+        n = self.filterbank.count
 
-    def calculate_pos(self, width, style, scalex, scaley, min_scale):
-        SoundMeterBar.calculate_class_dim(soundmeter_rect_height, soundmeter_scale_perc, self.height)
+        self.bar_width = min(gp.min_bar_width, max(self.width / n, 2))
+        xs = self.bars_x_positions(n)
+        if style == Styles.WhiteBars:
+            self.bar_field = BarField(n, xs, self.height, gp.bar_color, (225, 241, 245))
+        elif style == Styles.MirroredStereo:
+            self.bar_field = StereoBarField(n, xs, self.height, gp.bar_color, (225, 241, 245))
+        else:
+            self.bar_field = SoundMeterField(n, xs, self.height)
+
+    def follow_filterbank(self):
+        """a track with another sample rate brings its own filterbank, the bars are only rebuilt when
+        that changes their number"""
+        filterbank = self.am.filterbank
+        if filterbank is self.filterbank:
+            return
+        if filterbank.count == self.filterbank.count:
+            self.filterbank = filterbank
+            return
+        y = self.bar_field.y
+        self.init_bars(self.style, filterbank.bands)
+        self.bar_field.set_positions(self.bars_x_positions(self.filterbank.count), y)
+
+    def bars_x_positions(self, n: int):
+        offset = (self.width - self.bar_width * n) // 2
+        return [i * self.bar_width + offset + self.bar_spacing / 2 for i in range(n)]
+
+    def calculate_pos(self, width, style, scalex, scaley, min_scale, smooth: bool = True):
+        SoundMeterField.calculate_class_dim(soundmeter_rect_height, soundmeter_scale_perc, self.height)
         self.rect_target_pos = (0, control_bar_upper_pos * scaley)
         self.rect_lower_pos = (0, control_bar_lower_pos * scaley)
         self.control_bar_rect = pg.Rect(
@@ -223,11 +246,11 @@ class Application:
             width,
             control_bar_height,
         )
-        resized_no_image = pg.transform.smoothscale(self.images["NoImage"], (50 * min_scale, 50 * min_scale))
+        resized_no_image = scale_cache.scale(self.images["NoImage"], (50 * min_scale, 50 * min_scale), smooth)
         self.lower_preview_pos = (lower_preview_scale[0] * scalex, lower_preview_scale[1] * scaley)
         self.preview_pos = (lower_preview_scale[0] * scalex, lower_preview_scale[1] * scaley)
 
-        Bar.scale = white_bars_scale_perc * min_scale
+        BarField.scale = white_bars_scale_perc * min_scale
         self.preview_size = (min_scale * preview_size, min_scale * preview_size)
 
         white_surf = pg.Surface(self.preview_size, pg.SRCALPHA)
@@ -241,78 +264,126 @@ class Application:
         self.song_info_summary_surf = pg.Surface((270 * scalex, 120 * scaley), pg.HWSURFACE | pg.SRCALPHA)
         self.song_info_summary_surf.fill((0, 0, 0, 0))
         self.song_summ_pos = [song_info_summary_pos[0] * scalex, song_info_summary_pos[1] * scaley]
+        self.title_marquee.speed = self.artist_marquee.speed = gp.marquee_speed * scalex
 
-        preview_img = self.am.resize_preview(self.preview_size)
-        if preview_img is not None:
-            white_surf = pg.Surface(preview_img.get_size(), pg.SRCALPHA)
-            pg.draw.rect(white_surf, (255, 255, 255), white_surf.get_rect(), border_radius=4)
-            preview_img.blit(white_surf, (0, 0), special_flags=pg.BLEND_RGBA_MIN)
-            self.preview_img = preview_img
-        else:
-            self.preview_img = self.place_holder_preview
+        self.set_preview(self.am.resize_preview(self.preview_size, smooth))
 
-        if style == Styles.WhiteBars:
+        if style in (Styles.WhiteBars, Styles.MirroredStereo):
             self.target_bars_height = scaley * white_bars_target_pos
             self.upper_bars_height = scaley * white_bars_upper_pos
         else:
             self.upper_bars_height = scaley * soundmeter_bars_upper_pos
             self.target_bars_height = scaley * soundmeter_bars_target_pos
 
+    def set_preview(self, preview_img: pg.Surface | None):
+        """rounds the corners of a scaled cover, the placeholder when there is none (yet)"""
+        if preview_img is None:
+            self.preview_img = self.place_holder_preview
+            return
+        white_surf = pg.Surface(preview_img.get_size(), pg.SRCALPHA)
+        pg.draw.rect(white_surf, (255, 255, 255), white_surf.get_rect(), border_radius=4)
+        preview_img.blit(white_surf, (0, 0), special_flags=pg.BLEND_RGBA_MIN)
+        self.preview_img = preview_img
+
     def init_font(self, font_size, font_path: str):
+        """fonts are kept per size, going back to a size seen before loads nothing from disk"""
+        key = (font_path, font_size)
+        fonts = self.fonts.pop(key, None)
+        if fonts is None:
+            fonts = self.load_fonts(font_size, font_path)
+        self.fonts[key] = fonts
+        if len(self.fonts) > gp.font_cache_size:
+            # text rendered with the evicted fonts can never be hit again
+            for font in self.fonts.popitem(last=False)[1]:
+                text_cache.forget(font)
+        self.font, self.small_font = fonts
+
+    def load_fonts(self, font_size, font_path: str):
         try:
-            self.font = pg.font.Font(font_path, font_size)
-            self.small_font = pg.font.Font(font_path, int(font_size * 0.8))
+            font = pg.font.Font(font_path, font_size)
+            small_font = pg.font.Font(font_path, int(font_size * 0.8))
         except FileNotFoundError:
-            self.font = pg.font.SysFont("Arial Black", size=font_size)
-            self.small_font = pg.font.SysFont("Arial Black", int(font_size * 0.8))
-        self.font.set_bold(True)
-        self.small_font.set_bold(False)
+            font = pg.font.SysFont("Arial Black", size=font_size)
+            small_font = pg.font.SysFont("Arial Black", int(font_size * 0.8))
+        font.set_bold(True)
+        small_font.set_bold(False)
+        return font, small_font
 
     def resize_win32(self):
         new_size = (self.window.get_width(), self.window.get_height())
         if (self.width, self.height) != new_size:
-            self.resize(new_size)
+            self.resize(new_size, smooth=False)
         self.draw()
         self.update()
 
-    def resize(self, n_size):
-        self.width, self.height = max(n_size[0], gp.MIN_WIDTH), max(n_size[1], gp.MIN_HEIGHT)
-        if (self.width, self.height) != n_size:
+    def request_resize(self, n_size):
+        self.pending_size = n_size
+
+    def apply_resize(self):
+        """one rebuild per frame however many resize events came in, drafted with cheap scaling while
+        they keep coming and redone at full quality once they stopped for resize_settle seconds"""
+        if self.pending_size is not None:
+            self.resize(self.pending_size, smooth=False)
+            self.pending_size = None
+        elif self.draft and time.perf_counter() - self.last_resize >= gp.resize_settle:
+            self.resize((self.width, self.height))
+
+    def resize(self, n_size, smooth: bool = True):
+        self.draft = not smooth
+        self.last_resize = time.perf_counter()
+        # headless frames are exactly the size asked for, only a real window has a minimum
+        min_width, min_height = (1, 1) if self.headless else (gp.MIN_WIDTH, gp.MIN_HEIGHT)
+        self.width, self.height = max(n_size[0], min_width), max(n_size[1], min_height)
+        if (self.width, self.height) != self.window.get_size():
             self.window = pg.display.set_mode((self.width, self.height), flags=self.flags)
         self.scales = [self.width / gp.base_resolution[0], self.height / gp.base_resolution[1]]
         self.min_scale = min(self.scales)
-        self.calculate_pos(self.width, self.style, self.scales[0], self.scales[1], self.min_scale)
+        self.calculate_pos(self.width, self.style, self.scales[0], self.scales[1], self.min_scale, smooth)
         self.font_size = int(self.base_font_size * self.min_scale)
         self.init_font(self.font_size, self.font_path)
+        self.compositor.resize(self.window)
 
-        if not self.indexes:
+        if not self.filterbank.count:
             return
-        self.bar_width = min(gp.min_bar_width, max(self.width / (len(self.indexes)), 2))
+        self.bar_width = min(gp.min_bar_width, max(self.width / self.filterbank.count, 2))
+        self.bar_field.set_positions(self.bars_x_positions(self.filterbank.count), self.target_bars_height)
+        scales = (self.scales[0], self.scales[1])
+        self.play_pause_toggle.resize(self.images, scales, self.am.get_audio_state(), smooth)
+        self.skip_button.resize(self.images, scales, self.am.get_next_button_state(), smooth)
+        self.prev_button.resize(self.images, scales, self.am.get_previous_button_state(), smooth)
+        self.slider.resize(scales, self.small_font, smooth)
 
-        offset = (self.width - self.bar_width * len(self.indexes)) // 2
-        for i in range(len(self.bars)):
-            self.bars[i].pos = (
-                i * self.bar_width + offset + self.bar_spacing / 2,
-                self.target_bars_height,
-            )
-        self.play_pause_toggle.resize(self.images, (self.scales[0], self.scales[1]), self.am.get_audio_state())
-        self.skip_button.resize(self.images, (self.scales[0], self.scales[1]), self.am.get_next_button_state())
-        self.prev_button.resize(self.images, (self.scales[0], self.scales[1]), self.am.get_previous_button_state())
-        self.slider.resize((self.scales[0], self.scales[1]), self.small_font)
+    def loading_rect(self):
+        return pg.Rect(self.width * 0.05, self.height * 0.05, self.width * 0.2, self.height * 0.15)
+
+    def loading_signature(self):
+        return self.scanner.progress() if self.scanner.busy() else None
 
-    def display_loading(self):
-        rect = pg.Rect(self.width * 0.05, self.height * 0.05, self.width * 0.2, self.height * 0.15)
+    def loading_bounds(self):
+        return self.loading_rect().inflate(self.width * 0.1, 4) if self.scanner.busy() else None
+
+    def display_loading(self, surface: pg.Surface):
+        if not self.scanner.busy():
+            return
+        rect = self.loading_rect()
         pos = (rect.center[0], rect.center[1])
-        text_render = self.font.render("Loading file...", color=(255, 255, 255), antialias=True)
-        pg.draw.rect(self.window, (0, 0, 0), rect, border_radius=8)
-        pg.draw.rect(self.window, (255, 255, 255), rect, 5, border_radius=8)
+        done, found = self.scanner.progress()
+        text = f"Loading {done}/{found}" if found > 1 else "Loading file..."
+        text_render = text_cache.render(self.font, text, (255, 255, 255))
+        pg.draw.rect(surface, (0, 0, 0), rect, border_radius=8)
+        pg.draw.rect(surface, (255, 255, 255), rect, 5, border_radius=8)
         pos = text_render.get_rect(center=pos)
-        self.window.blit(text_render, pos)
+        surface.blit(text_render, pos)
 
     def add_file(self):
-        with self.reading_from_queue_lock:
-            while self.files_queue:
-                self.am.add(self.files_queue.pop(0))
+        """queues what the scanner validated since last frame, a bounded amount per frame"""
+        files = self.scanner.drain(gp.files_added_per_frame)
+        if not files:
+            return
+        self.am.add(files)
+        update_dict = self.am.get_buttons_state()
+        self.play_pause_toggle.update(update_dict["toggle"])
+        self.skip_button.update(update_dict["next"])
 
     def handle_events(self):
         for event in pg.event.get():
@@ -336,26 +407,26 @@ class Application:
                     self.am.set_pos(min(duration, max(current + 10, 0)))
                 if event.key == pg.K_s:
                     self.am.set_pos(50)
+                if event.key == pg.K_F3:
+                    self.profiler.toggle()
             if event.type == pg.MOUSEMOTION:
                 self.show_control_bar = True
                 self.last_update_time = time.time() * 1000
             if event.type == pg.VIDEORESIZE:
                 pf.resize(
-                    self.resize,
+                    self.request_resize,
                     event.size,
                 )
 
             if event.type == pg.DROPFILE:
                 self.temp_queue.append(event.file)
 
+        self.apply_resize()
+
         if self.temp_queue:
-            self.am.add(self.temp_queue)
-            update_dict = self.am.get_buttons_state()
-            toggle_icon_key = update_dict["toggle"]
-            next_icon_key = update_dict["next"]
-            self.play_pause_toggle.update(toggle_icon_key)
-            self.skip_button.update(next_icon_key)
+            self.scanner.scan(self.temp_queue)
             self.temp_queue.clear()
+        self.add_file()
 
         if self.play_pause_toggle.check_input():
             self.am.toggle_pause()
@@ -386,16 +457,22 @@ class Application:
             self.rendered_text["title"] = update_dict["title"]
             self.play_pause_toggle.update(toggle_icon_key)
             self.skip_button.update(next_icon_key)
-            if preview_img is not None:
-                white_surf = pg.Surface(preview_img.get_size(), pg.SRCALPHA)
-                pg.draw.rect(white_surf, (255, 255, 255), white_surf.get_rect(), border_radius=4)
-                preview_img.blit(white_surf, (0, 0), special_flags=pg.BLEND_RGBA_MIN)
-                self.preview_img = preview_img
-            else:
-                self.preview_img = self.place_holder_preview
+            self.set_preview(preview_img)
             self.slider.set_range((0, duration))
+            self.slider.set_waveform(None)
+            self.follow_filterbank()
+
+        # the cover is decoded in a worker, the placeholder stays up until its thumbnails arrive
+        if self.am.adopt_cover():
+            self.set_preview(self.am.resize_preview(self.preview_size))
+
+        if self.slider.waveform is None:
+            waveform = self.am.get_waveform()
+            if waveform is not None:
+                self.slider.set_waveform(waveform)
 
         self.slider.update_elapsed_time(self.am.get_current_audio_pos())
+        self.update_song_info()
 
         t = time.time() * 1000
         if t - self.last_update_time >= 1500 and (
@@ -409,13 +486,12 @@ class Application:
             if slider_update_status[0]:
                 self.am.set_pos(self.slider.output)
             offset = (self.control_bar_rect.top - self.rect_target_pos[1]) * self.dt * 6
-            offset_bars = (self.bars[0].pos[1] - self.upper_bars_height) * self.dt * 7
+            offset_bars = (self.bar_field.y - self.upper_bars_height) * self.dt * 7
         elif self.control_bar_rect.top <= self.rect_lower_pos[1] * 0.98:
             offset = (self.control_bar_rect.top - self.rect_lower_pos[1]) * self.dt * 6
-            offset_bars = (self.bars[0].pos[1] - self.target_bars_height) * self.dt * 7
+            offset_bars = (self.bar_field.y - self.target_bars_height) * self.dt * 7
         if offset != 0:
-            for bar in self.bars:
-                bar.pos = (bar.pos[0], bar.pos[1] - offset_bars)
+            self.bar_field.move_by(-offset_bars)
             self.control_bar_rect.top = self.control_bar_rect.top - offset
             self.play_pause_toggle.move_by(-offset)
 
@@ -428,74 +504,185 @@ class Application:
             self.preview_pos = (self.preview_pos[0], int(self.preview_pos[1] - offset))
             self.song_summ_pos[1] = int(self.song_summ_pos[1] - offset)
             if self.style == Styles.SoundMeter:
-                height = self.height - (self.height - self.control_bar_rect.top)
+                # snapped, so a slide goes through a few cell geometries the sprite cache keeps
+                height = round(self.control_bar_rect.top / soundmeter_height_step) * soundmeter_height_step
                 ratio = height / self.height
-                SoundMeterBar.calculate_class_dim(ratio * soundmeter_rect_height, soundmeter_scale_perc * ratio, height)
+                SoundMeterField.calculate_class_dim(ratio * soundmeter_rect_height, soundmeter_scale_perc * ratio, height)
+
+        self.profiler.mark("update")
+        if self.am.pop_beats():
+            self.bar_field.beat(self.am.get_rhythm()["confidence"])
+        if self.style == Styles.MirroredStereo:
+            amps = self.am.get_stereo_amps()
+            self.bar_field.update(amps, self.dt, self.bar_min_height, self.bar_max_height, self.am.get_correlation())
+        else:
+            self.bar_field.update(self.am.get_amps(), self.dt, self.bar_min_height, self.bar_max_height)
+        self.profiler.mark("bar_update")
+
+    def draw_button(self, button: ToggleButtons, surface: pg.Surface):
+        draw_expend_rect(button.outline_rect, (35, 35, 35), 4, -3, 0, 4, surface)
+        button.draw(surface)
+        draw_expend_rect(button.outline_rect, (0, 0, 0), 0, 0, 2, 4, surface)
+
+    def init_layers(self):
+        """bottom to top, cached layers are only re-rendered when their signature changes"""
+        self.compositor.add_layer(
+            Layer("background", lambda surface: surface.fill(bluish_grey), lambda: None, self.window.get_rect, alpha=False)
+        )
+        self.compositor.add_layer(Layer("chrome", self.draw_chrome, self.chrome_signature, self.chrome_bounds))
+        self.compositor.add_layer(
+            Layer(
+                "bars",
+                lambda surface: self.bar_field.draw(surface, self.bar_width - self.bar_spacing),
+                lambda: (self.bar_width, self.bar_field.state()),
+                lambda: self.bar_field.bounds(self.bar_width - self.bar_spacing),
+                cached=False,
+            )
+        )
+        self.compositor.add_layer(
+            Layer("loading", self.display_loading, self.loading_signature, self.loading_bounds, cached=False)
+        )
+        self.compositor.add_layer(Layer("text", self.draw_song_info, self.song_info_signature, self.song_info_bounds))
+        self.compositor.add_layer(
+            Layer(
+                "overlay",
+                lambda surface: self.profiler.draw(surface, (8, 8)),
+                lambda: self.profiler.frame if self.profiler.visible else None,
+                lambda: self.profiler.layout(self.small_font, (8, 8)),
+                cached=False,
+            )
+        )
 
-        amps = self.am.get_amps()
-        for bar in self.bars:
-            bar.update(amps, self.dt, self.bar_min_height, self.bar_max_height)
+    def draw_chrome(self, surface: pg.Surface):
+        """control bar, its buttons, the slider and the cover preview"""
+        if self.control_bar_rect.top >= self.height:
+            return
+        draw_expend_rect(self.control_bar_rect, (15, 15, 15), 8, -4, 4, 4, surface)
+        pg.draw.rect(surface, (200, 200, 200), self.control_bar_rect, border_radius=4)
+        pg.draw.rect(surface, (160, 160, 160), self.control_bar_rect, border_radius=4, width=6)
+        draw_expend_rect(self.control_bar_rect, (15, 15, 15), 0, 0, 3, 4, surface)  # control bar outline
+
+        # DRAWING PLAY_PAUSE_BUTTON
+        self.draw_button(self.play_pause_toggle, surface)
+
+        # DRAWING NEXT_BUTTON
+        self.draw_button(self.skip_button, surface)
+
+        # DRAWING PREV_BUTTON
+        self.draw_button(self.prev_button, surface)
+
+        self.slider.draw(surface)
+
+        # DRAWING PREVIEW IMAGE
+        r = self.preview_img.get_rect(top=self.preview_pos[1], left=self.preview_pos[0])
+        draw_expend_rect(r, (35, 35, 35), 4, -3, 0, 4, surface)
+        surface.blit(self.preview_img, self.preview_pos)
+        draw_expend_rect(r, (160, 160, 160), 0, 0, 3, 4, surface)  # outline
+        draw_expend_rect(r, (0, 0, 0), 0, 0, 2, 4, surface)  # outline
+
+    def chrome_signature(self):
+        buttons = [
+            (button.color, id(button.current_image), button.rectangle.topleft)
+            for button in (self.play_pause_toggle, self.skip_button, self.prev_button)
+        ]
+        slider = self.slider
+        return (
+            self.control_bar_rect.topleft,
+            self.control_bar_rect.size,
+            buttons,
+            slider.rectangle_bar.topleft,
+            slider.button_rect.topleft,
+            slider.button_color,
+            slider.format_function(slider.output),
+            slider.format_function(slider.range[-1]),
+            id(slider.font),
+            id(slider.waveform_surfs),
+            id(self.preview_img),
+            tuple(self.preview_pos),
+        )
 
-        self.dt = min(self.clock.tick(self.fps) * 0.001, 0.066)
+    def chrome_bounds(self):
+        top = self.control_bar_rect.top
+        if top >= self.height:
+            return None
+        # the drop shadow reaches 4 px above the bar
+        return pg.Rect(0, top - 8, self.width, self.height - top + 8)
+
+    def song_info_width(self) -> int:
+        return int(self.song_info_summary_surf.get_width() - 5 * self.scales[0])
+
+    def update_song_info(self):
+        """titles that overflow the song info box scroll, the cached text surface only moves under a clip"""
+        width = self.song_info_width()
+        self.title_marquee.set_text(self.font, self.rendered_text.get("title"), (0, 0, 0))
+        self.artist_marquee.set_text(self.small_font, self.rendered_text.get("artist"), (0, 0, 0))
+        self.title_marquee.update(self.dt, width)
+        self.artist_marquee.update(self.dt, width)
+
+    def draw_song_info(self, surface: pg.Surface):
+        self.song_info_summary_surf.fill((0, 0, 0, 0))
+        width = self.song_info_width()
+        self.title_marquee.draw(self.song_info_summary_surf, (5 * self.scales[0], 20 * self.scales[1]), width)
+        self.artist_marquee.draw(self.song_info_summary_surf, (5 * self.scales[0], 45 * self.scales[1]), width)
+        surface.blit(self.song_info_summary_surf, self.song_summ_pos)
+
+    def song_info_signature(self):
+        return (
+            self.title_marquee.key,
+            self.title_marquee.position(),
+            self.artist_marquee.key,
+            self.artist_marquee.position(),
+            tuple(self.song_summ_pos),
+        )
 
-    def draw_button(self, button: ToggleButtons):
-        draw_expend_rect(button.outline_rect, (35, 35, 35), 4, -3, 0, 4, self.window)
-        button.draw(self.window)
-        draw_expend_rect(button.outline_rect, (0, 0, 0), 0, 0, 2, 4, self.window)
+    def song_info_bounds(self):
+        return pg.Rect(self.song_summ_pos, self.song_info_summary_surf.get_size()).inflate(2, 2)
 
     def draw(self):
-        self.window.fill(bluish_grey)
-        self.song_info_summary_surf.fill((0, 0, 0, 0))
-
-        # drawing control bar----------------------------
-        if self.control_bar_rect.top < self.height:
-            draw_expend_rect(self.control_bar_rect, (15, 15, 15), 8, -4, 4, 4, self.window)
-            pg.draw.rect(self.window, (200, 200, 200), self.control_bar_rect, border_radius=4)
-            pg.draw.rect(self.window, (160, 160, 160), self.control_bar_rect, border_radius=4, width=6)
-            draw_expend_rect(self.control_bar_rect, (15, 15, 15), 0, 0, 3, 4, self.window)  # control bar outline
-
-            # DRAWING PLAY_PAUSE_BUTTON
-            self.draw_button(self.play_pause_toggle)
-
-            # DRAWING NEXT_BUTTON
-            self.draw_button(self.skip_button)
-
-            # DRAWING PREV_BUTTON
-            self.draw_button(self.prev_button)
-
-            self.slider.draw(self.window)
-
-            # DRAWING PREVIEW IMAGE
-            r = self.preview_img.get_rect(top=self.preview_pos[1], left=self.preview_pos[0])
-            draw_expend_rect(r, (35, 35, 35), 4, -3, 0, 4, self.window)
-            self.window.blit(self.preview_img, self.preview_pos)
-            draw_expend_rect(r, (160, 160, 160), 0, 0, 3, 4, self.window)  # outline
-            draw_expend_rect(r, (0, 0, 0), 0, 0, 2, 4, self.window)  # outline
-        # ---------------------------
-
-        for bar in self.bars:
-            bar.draw(self.window, self.bar_width - self.bar_spacing)
-        if len(self.files_queue) > 0:
-            self.display_loading()
-        title = self.font.render(self.rendered_text["title"], True, (0, 0, 0))
-        artist = self.small_font.render(self.rendered_text["artist"], True, (0, 0, 0))
-        self.song_info_summary_surf.blit(title, (5 * self.scales[0], 20 * self.scales[1]))
-        self.song_info_summary_surf.blit(artist, (5 * self.scales[0], 45 * self.scales[1]))
-        self.window.blit(self.song_info_summary_surf, self.song_summ_pos)
-        pg.display.flip()
+        rects = self.compositor.collect()
+        self.profiler.pushed_pixels = self.compositor.pushed_pixels
+        self.profiler.track_change = self.am.get_track_change_latency()
+        self.compositor.compose(rects)
+        self.compositor.present(rects)
+        self.profiler.mark("flip")
 
     def run(self):
         while self.running:
+            self.profiler.begin_frame()
             self.handle_events()
+            self.profiler.mark("events")
             self.update()
             self.draw()
+            self.profiler.end_frame()
+            self.dt = min(self.clock.tick(self.fps) * 0.001, 0.066)
+        self.profiler.close()
+        self.scanner.shutdown()
         self.am.terminate()
         pg.quit()
         sys.exit()
 
+    def render_frames(self, filepaths: list, max_seconds: float = None):
+        """headless counterpart of run(): plays the tracks through AudioManager.pump() with a fixed
+        dt of 1 / fps and yields the window after every draw, as fast as frames can be drawn"""
+        self.dt = 1 / self.fps
+        self.am.add(filepaths)
+        frame = 0
+        while max_seconds is None or frame < max_seconds * self.fps:
+            self.am.pump(self.dt)
+            self.update()
+            if self.am.current is None and self.am.current_index >= len(self.am.audio_queue):
+                break
+            self.draw()
+            yield self.window
+            frame += 1
+        self.scanner.shutdown()
+        self.am.terminate()
+
 
 if __name__ == "__main__":
     # main()
+    # worker processes (spectrogram precomputation) re-import main in frozen builds
+    multiprocessing.freeze_support()
     app = Application(
         "assets/fonts/PixCon.ttf",
         13,
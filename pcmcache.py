@@ -0,0 +1,33 @@
+import os, numpy as np, soundfile as sf, globals as gp
+from diskcache import MemmapCache, write_meta
+
+
+def decode_to_pcm(filepath: str, path: str, chunk: int = 2**16):
+    """runs in a worker process: decodes the whole track once into raw interleaved int16 at `path`"""
+    with sf.SoundFile(filepath) as file:
+        tmp_path = path + ".tmp"
+        frames = 0
+        with open(tmp_path, "wb") as out:
+            for block in file.blocks(blocksize=chunk, dtype=gp.dtype, always_2d=True):
+                out.write(block.tobytes())
+                frames += len(block)
+        channels = file.channels
+        sample_rate = file.samplerate
+    os.replace(tmp_path, path)
+    write_meta(path, shape=[frames, channels], sample_rate=sample_rate)
+    return path
+
+
+class PCMCache(MemmapCache):
+    """Fully decoded tracks as raw PCM files; a memmap of one gives O(1) seeks and lets the callback
+    hand slices of it to the device without copying."""
+
+    suffix = ".pcm"
+    dtype = np.int16
+
+    def __init__(self, directory: str, max_bytes: int, workers: int = 1) -> None:
+        super().__init__(directory, max_bytes, decode_to_pcm, gp.dtype, workers)
+
+    def get(self, filepath: str) -> np.memmap | None:
+        entry = super().get(filepath)
+        return None if entry is None else entry[0]
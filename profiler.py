@@ -0,0 +1,196 @@
+import os, time, json, numpy as np, pygame as pg
+
+
+class FrameProfiler:
+    """Wall time of every named stage of a frame, kept in a ring of the last `history` frames.
+
+    mark(name) closes the stage that began at the previous mark, so instrumenting the loop is one call
+    after every step. Outside of begin_frame/end_frame, or while nothing records, mark() is a single
+    attribute check. Rolling p50/p95/max, the frame time graph and deadline misses are read from the
+    ring, and with a dump path every frame is also written as a CSV or JSONL row."""
+
+    max_stages = 16
+    refresh_frames = 15  # overlay text is re-rendered this often, the graph every frame
+    graph_size = (240, 60)
+
+    def __init__(self, fps: int, stages: list = (), history: int = 600, visible: bool = False, dump_path: str = None):
+        self.budget = 1 / fps if fps else 0.0
+        self.stages = {}
+        for name in stages:
+            self.add_stage(name)
+        self.times = np.zeros((history, FrameProfiler.max_stages))
+        self.work = np.zeros(history)  # begin_frame to end_frame, what has to fit in the budget
+        self.intervals = np.zeros(history)  # begin_frame to the next begin_frame, what the user sees
+        self.frame = 0
+        self.missed = 0
+        self.last = None
+        self.frame_start = None
+        self.visible = visible
+        self.dump = None
+        self.dump_csv = False
+        self.header_written = False
+        if dump_path:
+            self.open_dump(dump_path)
+        self.text_surf = None
+        self.graph_surf = None
+        self.pushed_pixels = None  # reported by the compositor, pixels sent to the display this frame
+        self.track_change = None  # reported by the audio manager, seconds of silence at the last track change
+
+    @property
+    def recording(self) -> bool:
+        return self.visible or self.dump is not None
+
+    def add_stage(self, name: str) -> int:
+        if len(self.stages) == FrameProfiler.max_stages:
+            raise ValueError(f"more than {FrameProfiler.max_stages} profiler stages")
+        self.stages[name] = len(self.stages)
+        return self.stages[name]
+
+    def open_dump(self, path: str):
+        """.csv gets a header and one column per stage, anything else one JSON object per line"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.dump = open(path, "w", buffering=2**16)
+        self.dump_csv = path.endswith(".csv")
+
+    def close(self):
+        if self.dump is not None:
+            self.dump.close()
+            self.dump = None
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            self.reset()
+
+    def reset(self):
+        self.times.fill(0)
+        self.work.fill(0)
+        self.intervals.fill(0)
+        self.frame = 0
+        self.missed = 0
+        self.frame_start = None
+        self.last = None
+
+    def begin_frame(self):
+        if not self.recording:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.intervals[(self.frame - 1) % len(self.intervals)] = now - self.frame_start
+        self.frame_start = self.last = now
+        self.times[self.frame % len(self.times)] = 0
+
+    def mark(self, name: str):
+        if self.last is None:
+            return
+        now = time.perf_counter()
+        column = self.stages.get(name)
+        if column is None:
+            column = self.add_stage(name)
+        self.times[self.frame % len(self.times), column] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if self.last is None:
+            return
+        row = self.frame % len(self.times)
+        work = self.last - self.frame_start
+        self.work[row] = work
+        if work > self.budget:
+            self.missed += 1
+        if self.dump is not None:
+            self.write_row(row)
+        self.frame += 1
+        self.last = None
+
+    def write_row(self, row: int):
+        times = self.times[row, : len(self.stages)] * 1000
+        if self.dump_csv:
+            if not self.header_written:
+                self.dump.write(",".join(["frame", "time", "work_ms", *self.stages]) + "\n")
+                self.header_written = True
+            values = ",".join(f"{value:.4f}" for value in times)
+            self.dump.write(f"{self.frame},{self.frame_start:.6f},{self.work[row] * 1000:.4f},{values}\n")
+        else:
+            stages = {name: round(float(times[column]), 4) for name, column in self.stages.items()}
+            record = {"frame": self.frame, "time": self.frame_start, "work_ms": round(self.work[row] * 1000, 4)}
+            record["stages"] = stages
+            self.dump.write(json.dumps(record) + "\n")
+
+    def summary(self) -> dict:
+        """rolling p50/p95/max in milliseconds of every stage and of the whole frame"""
+        filled = min(self.frame, len(self.times))
+        if filled == 0:
+            return {}
+        columns = np.column_stack((self.times[:filled, : len(self.stages)], self.work[:filled])) * 1000
+        p50, p95 = np.percentile(columns, (50, 95), axis=0)
+        peak = columns.max(axis=0)
+        names = [*self.stages, "frame"]
+        return {name: (p50[i], p95[i], peak[i]) for i, name in enumerate(names)}
+
+    def ordered(self, ring: np.ndarray) -> np.ndarray:
+        """the ring oldest first, only the rows written so far"""
+        filled = min(self.frame, len(ring))
+        if filled < len(ring):
+            return ring[:filled]
+        start = self.frame % len(ring)
+        return np.concatenate((ring[start:], ring[:start]))
+
+    def render_text(self, font: pg.font.Font):
+        """a stage/p50/p95/max table in fixed columns, the font is not monospaced"""
+        rows = [("ms", "p50", "p95", "max")]
+        for name, values in self.summary().items():
+            rows.append((name, *(f"{value:.2f}" for value in values)))
+        cells = [[font.render(cell, True, (255, 255, 255)) for cell in row] for row in rows]
+        footers = [f"missed {self.missed}/{self.frame} over {self.budget * 1000:.1f} ms"]
+        if self.pushed_pixels is not None:
+            footers[0] += f", pushed {self.pushed_pixels / 1000:.0f}k px"
+        if self.track_change is not None:
+            footers.append(f"track change {self.track_change * 1000:.2f} ms")
+        footers = [font.render(footer, True, (255, 255, 255)) for footer in footers]
+        widths = [max(row[i].get_width() for row in cells) + 10 for i in range(4)]
+        line = footers[0].get_height()
+        width = max(sum(widths), *(footer.get_width() for footer in footers)) + 8
+        self.text_surf = pg.Surface((width, line * (len(cells) + len(footers)) + 8), pg.SRCALPHA)
+        self.text_surf.fill((0, 0, 0, 170))
+        for y, row in enumerate(cells):
+            x = 4
+            for width, cell in zip(widths, row):
+                # numbers are right aligned in their column
+                self.text_surf.blit(cell, (x if cell is row[0] else x + width - 10 - cell.get_width(), 4 + y * line))
+                x += width
+        for i, footer in enumerate(footers):
+            self.text_surf.blit(footer, (4, 4 + (len(cells) + i) * line))
+
+    def draw_graph(self) -> pg.Surface:
+        """frame intervals (grey) and work (white) over the history, the red line is the budget"""
+        width, height = FrameProfiler.graph_size
+        if self.graph_surf is None:
+            self.graph_surf = pg.Surface((width, height), pg.SRCALPHA)
+        self.graph_surf.fill((0, 0, 0, 170))
+        scale = height / (self.budget * 2 if self.budget else 0.033)
+        budget_y = height - self.budget * scale
+        pg.draw.line(self.graph_surf, (200, 40, 40), (0, budget_y), (width, budget_y))
+        for ring, color in ((self.intervals, (110, 110, 110)), (self.work, (255, 255, 255))):
+            values = self.ordered(ring)[-width:]
+            if len(values) < 2:
+                continue
+            xs = np.arange(len(values)) + (width - len(values))
+            ys = np.clip(height - values * scale, 0, height - 1)
+            pg.draw.lines(self.graph_surf, color, False, np.column_stack((xs, ys)).tolist())
+        return self.graph_surf
+
+    def layout(self, font: pg.font.Font, pos: tuple) -> pg.Rect | None:
+        """re-renders the text when it is due and returns the rect draw() will cover, None when hidden"""
+        if not self.visible:
+            return None
+        if self.text_surf is None or self.frame % FrameProfiler.refresh_frames == 0:
+            self.render_text(font)
+        width = max(self.text_surf.get_width(), FrameProfiler.graph_size[0])
+        return pg.Rect(pos, (width, self.text_surf.get_height() + 4 + FrameProfiler.graph_size[1]))
+
+    def draw(self, surface: pg.Surface, pos: tuple):
+        if not self.visible or self.text_surf is None:
+            return
+        surface.blit(self.text_surf, pos)
+        surface.blit(self.draw_graph(), (pos[0], pos[1] + self.text_surf.get_height() + 4))
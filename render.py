@@ -0,0 +1,119 @@
+"""Renders the visualizer offline, faster than realtime, to raw frames or numbered images.
+
+python render.py track.mp3 -o - --size 1920x1080 --fps 60 | ffmpeg -f rawvideo -pix_fmt bgr0 -s 1920x1080 -r 60 -i - -i track.mp3 out.mp4
+python render.py track.mp3 -o frames/%06d.png
+
+--pix-fmt bgr0 (the default) writes the display surface's own pixels without any conversion and is
+the format meant for rendering several times faster than realtime. rgb24 costs one blit into a 24-bit
+surface per frame, about 2 ms at 1920x1080, which is as much as composing a frame of the lighter
+styles: use it only when the consumer can't take bgr0. Pass the same -pix_fmt to ffmpeg."""
+
+import os, sys, time, argparse, multiprocessing
+
+# no window and no audio device are opened, frames only live in the display surface
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame as pg
+from main import Application, Styles
+
+
+PIXEL_FORMATS = {"rgb24": "RGB", "bgr0": "BGRA"}
+
+
+def frame_writer(out, pix_fmt: str):
+    """returns a function writing one frame without going through pg.image.tobytes when it can:
+    bgr0 hands over the surface memory as is when it is already tightly packed little-endian xrgb,
+    which is what SDL gives the dummy display; rgb24 blits into a 24-bit surface whose masks put the
+    bytes in R, G, B order and writes that surface's memory"""
+    layout = PIXEL_FORMATS[pix_fmt]
+    # 24-bit surface of the last frame size, with red in the lowest byte
+    rgb = {}
+
+    def write(window: pg.Surface):
+        width, height = window.get_size()
+        if layout == "BGRA":
+            native = window.get_bitsize() == 32 and window.get_masks()[:3] == (0xFF0000, 0xFF00, 0xFF)
+            if native and sys.byteorder == "little" and window.get_pitch() == width * 4:
+                out.write(window.get_buffer())
+                return
+        elif sys.byteorder == "little":
+            surface = rgb.get((width, height))
+            if surface is None:
+                rgb.clear()
+                surface = rgb[(width, height)] = pg.Surface((width, height), 0, 24, (0xFF, 0xFF00, 0xFF0000, 0))
+            # rows are padded to 4 bytes when width * 3 isn't a multiple of 4
+            if surface.get_pitch() == width * 3:
+                surface.blit(window, (0, 0))
+                out.write(surface.get_buffer())
+                return
+        out.write(pg.image.tobytes(window, layout))
+
+    return write
+
+
+def parse_size(text: str) -> tuple:
+    width, height = text.lower().split("x")
+    return (int(width), int(height))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="render the visualizer of one or more tracks without playing them")
+    parser.add_argument("tracks", nargs="+")
+    parser.add_argument("-o", "--output", default="-", help="raw frame file, - for stdout, or a pattern like frames/%%06d.png")
+    parser.add_argument("--pix-fmt", choices=PIXEL_FORMATS, default="bgr0", help="layout of raw frames, bgr0 is the fast one")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080))
+    parser.add_argument("--fps", type=int, default=60)
+    # __members__ keeps the aliases, iterating Styles would drop SoundMeter
+    parser.add_argument("--style", choices=list(Styles.__members__), default=Styles.WhiteBars.name)
+    parser.add_argument("--seconds", type=float, default=None, help="stop after this much audio")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    to_stdout = args.output == "-"
+    images = "%" in args.output
+    if to_stdout:
+        # the frames go through stdout, everything printed along the way goes to stderr
+        out = sys.stdout.buffer
+        sys.stdout = sys.stderr
+    elif images:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    else:
+        out = open(args.output, "wb")
+
+    app = Application(
+        "assets/fonts/PixCon.ttf", 13, args.fps, args.size, False, "Audio Visualizer", style=Styles[args.style], headless=True
+    )
+    app.resize(args.size)
+    write = None if images else frame_writer(out, args.pix_fmt)
+
+    frames = 0
+    t = time.perf_counter()
+    try:
+        for window in app.render_frames(args.tracks, args.seconds):
+            if images:
+                pg.image.save(window, args.output % frames)
+            else:
+                write(window)
+            frames += 1
+    finally:
+        if not images:
+            out.flush()
+            if not to_stdout:
+                out.close()
+    elapsed = time.perf_counter() - t
+    audio = frames / args.fps
+    print(
+        f"{frames} frames ({audio:.1f}s of audio) in {elapsed:.1f}s, {frames / max(elapsed, 1e-9):.1f} fps,"
+        f" {audio / max(elapsed, 1e-9):.2f}x realtime",
+        file=sys.stderr,
+    )
+    pg.quit()
+
+
+if __name__ == "__main__":
+    # the per-track caches are computed in worker processes that re-import this module
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,156 @@
+import math, numpy as np
+
+
+class OnsetDetector:
+    """Half-wave rectified spectral flux between consecutive band-reduced frames, O(bands)."""
+
+    def __init__(self) -> None:
+        self.bands = None
+        self.previous = None
+        self.difference = None
+
+    def reset(self):
+        if self.previous is not None:
+            self.previous.fill(0)
+
+    def process(self, bands: np.ndarray) -> float:
+        """bands is one frame of band values, any shape; returns its onset strength"""
+        if self.previous is None or self.previous.shape != bands.shape:
+            self.previous = bands.astype(np.float32)
+            self.difference = np.zeros_like(self.previous)
+            return 0.0
+        np.subtract(bands, self.previous, out=self.difference)
+        np.maximum(self.difference, 0, out=self.difference)
+        self.previous[:] = bands
+        return float(self.difference.sum()) / self.difference.size
+
+    def process_spectrum(self, filterbank, spectrum: np.ndarray) -> float:
+        """reduces a spectrum with the filterbank the bars use, then measures it"""
+        shape = spectrum.shape[:-1] + (filterbank.count,)
+        if self.bands is None or self.bands.shape != shape:
+            self.bands = np.zeros(shape, dtype=np.float32)
+        filterbank.reduce(spectrum, self.bands)
+        return self.process(self.bands)
+
+
+class BeatTracker:
+    """Tempo and beat phase from an onset strength envelope sampled at `frame_rate`.
+
+    Every frame the envelope is normalised against running statistics, a decaying autocorrelation
+    over the lags of min_bpm..max_bpm is updated in place (O(lags), bounded history) and the tempo is
+    its strongest lag weighted by a prior around 120 BPM or the track's tagged tempo. Beats come from a
+    flywheel running at that period that is pulled towards detected onsets close to where it expects a
+    beat."""
+
+    min_bpm = 60
+    max_bpm = 200
+    memory = 8  # seconds the autocorrelation effectively looks back
+    onset_threshold = 1.5  # standard deviations above the running mean
+    phase_correction = 0.35
+
+    def __init__(self, frame_rate: float, expected_bpm: float = None) -> None:
+        self.frame_rate = frame_rate
+        self.min_lag = max(int(frame_rate * 60 / BeatTracker.max_bpm), 2)
+        self.max_lag = max(int(math.ceil(frame_rate * 60 / BeatTracker.min_bpm)), self.min_lag + 2)
+        self.lags = np.arange(self.max_lag + 1)
+        bpm = 60 * frame_rate / np.maximum(self.lags, 1)
+        # log-gaussian tempo prior one octave wide, centred on the tagged tempo when there is one
+        self.prior = np.exp(-0.5 * np.log2(bpm / (expected_bpm or 120)) ** 2)
+        self.decay = math.exp(-1 / (frame_rate * BeatTracker.memory))
+        self.stats_rate = 1 / (frame_rate * 2)
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros(self.max_lag + 1)
+        self.acf = np.zeros(self.max_lag + 1)
+        self.scratch = np.zeros(self.max_lag + 1)
+        self.frame = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.previous = 0.0
+        self.period = None
+        self.confidence = 0.0
+        self.next_beat = None
+        self.last_beat = None
+        self.beats = 0
+        self.onset = 0.0
+
+    def resync(self):
+        """keeps the tempo but drops the beat phase, e.g. after a seek"""
+        self.next_beat = None
+
+    def process(self, strength: float):
+        frame = self.frame
+        deviation = strength - self.mean
+        self.mean += deviation * self.stats_rate
+        self.variance += (deviation * deviation - self.variance) * self.stats_rate
+        std = math.sqrt(self.variance)
+        value = max(deviation, 0.0)
+        self.onset = min(value / (BeatTracker.onset_threshold * std), 1.0) if std > 0 else 0.0
+
+        size = len(self.history)
+        self.history[frame % size] = value
+        np.take(self.history, (frame - self.lags) % size, out=self.scratch)
+        self.acf *= self.decay
+        self.scratch *= value
+        self.acf += self.scratch
+
+        onset = std > 0 and deviation > BeatTracker.onset_threshold * std and strength >= self.previous
+        self.previous = strength
+        if frame >= 2 * self.max_lag:
+            self.estimate_tempo()
+        self.advance(frame, onset)
+        self.frame = frame + 1
+
+    def estimate_tempo(self):
+        low, high = self.min_lag, self.max_lag
+        acf = self.acf
+        # a period between two lags splits its energy over both, score each lag with its neighbours
+        weighted = (acf[low - 1 : high] * 0.5 + acf[low : high + 1] + np.append(acf[low + 1 : high + 1], 0) * 0.5)
+        weighted *= self.prior[low : high + 1]
+        i = int(np.argmax(weighted))
+        if weighted[i] <= 0 or self.acf[0] <= 0:
+            self.period = None
+            self.confidence = 0.0
+            return
+        lag = float(low + i)
+        # parabolic refinement, the onset frames are coarse at large hop sizes
+        if 0 < i < len(weighted) - 1:
+            a, b, c = weighted[i - 1], weighted[i], weighted[i + 1]
+            denominator = a - 2 * b + c
+            if denominator < 0:
+                lag += 0.5 * (a - c) / denominator
+        self.period = float(lag)
+        self.confidence = float(min(self.acf[low + i] / self.acf[0], 1.0))
+
+    def advance(self, frame: int, onset: bool):
+        period = self.period
+        if period is None:
+            return
+        if self.next_beat is None:
+            if onset:
+                self.beat(frame)
+            return
+        error = frame - self.next_beat
+        if onset and abs(error) < period / 4:
+            self.next_beat += error * BeatTracker.phase_correction
+        if frame >= self.next_beat:
+            self.beat(frame)
+
+    def beat(self, frame: int):
+        self.last_beat = frame
+        # the flywheel keeps its fractional phase, only the first beat is placed on an onset frame
+        next_beat = frame if self.next_beat is None else self.next_beat
+        while next_beat <= frame:
+            next_beat += self.period
+        self.next_beat = next_beat
+        self.beats += 1
+
+    def get_tempo(self) -> float | None:
+        return None if self.period is None else float(60 * self.frame_rate / self.period)
+
+    def get_phase(self) -> float:
+        """0 on a beat rising to 1 just before the next one"""
+        if self.period is None or self.last_beat is None:
+            return 0.0
+        return min((self.frame - self.last_beat) / self.period, 1.0)
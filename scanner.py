@@ -0,0 +1,117 @@
+import os, threading, queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from audio import AudioFile
+from library import LibraryIndex
+
+
+class LibraryScanner:
+    """Expands dropped files and folders into playable tracks off the UI thread.
+
+    Folders are walked recursively on a walker thread and every candidate is probed on a thread
+    pool; files the LibraryIndex already knows (same mtime and size) skip the probe, and files already
+    seen this session with an unchanged stat skip the index lookup too. Valid paths come out of drain()
+    in walk order as soon as the probes ahead of them are done, at most `window` probes in flight."""
+
+    extensions = (".mp3", ".flac", ".wav", ".ogg", ".aiff", ".aif")
+    commit_every = 256
+    window = 256
+
+    def __init__(self, library: LibraryIndex, workers: int = 4) -> None:
+        self.library = library
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.walker = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.SimpleQueue()
+        self.seen = {}
+        self.lock = threading.Lock()
+        self.found = 0
+        self.done = 0
+        self.failed = 0
+        self.pending_scans = 0
+
+    def scan(self, paths: list):
+        with self.lock:
+            self.pending_scans += 1
+        self.walker.submit(self.walk, list(paths))
+
+    def walk(self, paths: list):
+        try:
+            futures = deque()
+            for path in paths:
+                for filepath in self.candidates(path):
+                    with self.lock:
+                        self.found += 1
+                    futures.append(self.pool.submit(self.probe, filepath))
+                    # hand over everything finished at the head, wait on it once the window is full
+                    while futures and (futures[0].done() or len(futures) >= self.window):
+                        self.collect(futures.popleft())
+            while futures:
+                self.collect(futures.popleft())
+            self.library.commit()
+        finally:
+            with self.lock:
+                self.pending_scans -= 1
+                if self.pending_scans == 0:
+                    self.found = self.done = self.failed = 0
+
+    def collect(self, future):
+        filepath, ok = future.result()
+        with self.lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            done = self.done
+        if filepath is not None:
+            self.results.put(filepath)
+        if done % self.commit_every == 0:
+            self.library.commit()
+
+    def candidates(self, path: str):
+        if os.path.isfile(path):
+            yield path
+            return
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(self.extensions):
+                    yield os.path.join(dirpath, name)
+
+    def probe(self, filepath: str):
+        """returns (filepath or None if it should not be queued, whether the file is valid)"""
+        stat = LibraryIndex.stat(filepath)
+        if stat is None:
+            return (None, False)
+        seen = self.seen.get(filepath)
+        if seen is not None and seen[0] == stat:
+            # dropped again: the metadata is already in the index, it still goes in the queue
+            return (filepath if seen[1] else None, seen[1])
+        if self.library.lookup(filepath, stat) is None:
+            try:
+                self.library.store(filepath, AudioFile.probe(filepath), stat, commit=False)
+            except Exception as e:
+                print(f"skipping {filepath}: {e}")
+                self.seen[filepath] = (stat, False)
+                return (None, False)
+        self.seen[filepath] = (stat, True)
+        return (filepath, True)
+
+    def drain(self, max_items: int) -> list:
+        """main thread side, never blocks"""
+        items = []
+        while len(items) < max_items:
+            try:
+                items.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def busy(self) -> bool:
+        return self.pending_scans > 0 or not self.results.empty()
+
+    def progress(self) -> tuple:
+        """(probed, found) across the scans currently running"""
+        return (self.done, self.found)
+
+    def shutdown(self):
+        self.walker.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
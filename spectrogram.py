@@ -0,0 +1,87 @@
+import os, numpy as np, soundfile as sf, globals as gp
+from scipy.signal.windows import hann
+from analyzer import SpectrumKernel
+from diskcache import MemmapCache, write_meta
+from filterbank import get_filterbank
+
+
+def compute_spectrogram(filepath: str, path: str, fft_size: int, hop_size: int, bands: int, scale: str, pooling: str):
+    """runs in a worker process: decodes the track hop by hop, exactly like the live Analyzer, and
+    writes one uint8 quantised row of filterbank bands per hop to `path` (raw) plus `path`.json"""
+    kernel = SpectrumKernel(fft_size, hann(fft_size))
+    spectrum = np.zeros(kernel.bins, dtype=np.float32)
+
+    with sf.SoundFile(filepath) as file:
+        filterbank = get_filterbank(file.samplerate, fft_size, bands, scale, pooling)
+        values = np.zeros(filterbank.count, dtype=np.float32)
+        frames_number = -(-file.frames // hop_size)
+        history = np.zeros((fft_size, file.channels), dtype=gp.dtype)
+        tmp_path = path + ".tmp"
+        rows = np.memmap(tmp_path, dtype=np.uint8, mode="w+", shape=(max(frames_number, 1), filterbank.count))
+        for k in range(frames_number):
+            history[:-hop_size] = history[hop_size:]
+            read = file.read(frames=hop_size, dtype=gp.dtype, always_2d=True, out=history[-hop_size:])
+            if len(read) < hop_size:
+                history[len(read) - hop_size :] = 0
+            kernel.process(history, spectrum)
+            filterbank.reduce(spectrum, values)
+            np.clip(values, 0, 1, out=values)
+            rows[k] = np.rint(values * 255)
+        rows.flush()
+        sample_rate = file.samplerate
+    del rows
+    os.replace(tmp_path, path)
+    write_meta(
+        path,
+        shape=[max(frames_number, 1), filterbank.count],
+        fft_size=fft_size,
+        hop_size=hop_size,
+        sample_rate=sample_rate,
+    )
+    return path
+
+
+class Spectrogram:
+    """a cached track's band rows, read straight from the memory-mapped file"""
+
+    def __init__(self, rows: np.memmap, hop_size: int) -> None:
+        self.rows = rows
+        self.hop_size = hop_size
+        self.count = rows.shape[1]
+        self.dequantize = np.arange(256, dtype=np.float32) / 255
+
+    def row_index(self, sample_pos: int) -> int:
+        """row of the hop that ends at sample_pos"""
+        return min(max(int(sample_pos // self.hop_size) - 1, 0), len(self.rows) - 1)
+
+    def row(self, k: int, out: np.ndarray) -> np.ndarray:
+        return np.take(self.dequantize, self.rows[k], out=out)
+
+    def frame_at(self, sample_pos: int, out: np.ndarray) -> np.ndarray:
+        """writes the bands of the hop that ends at sample_pos into out, the same values the live
+        analyzer's spectrum reduces to"""
+        return self.row(self.row_index(sample_pos), out)
+
+
+class SpectrogramCache(MemmapCache):
+    """Band-reduced spectrograms of upcoming tracks, precomputed so playback can skip live FFTs."""
+
+    suffix = ".u8"
+    dtype = np.uint8
+
+    def __init__(self, directory: str, max_bytes: int, fft_size: int, hop_size: int, workers: int = 1) -> None:
+        super().__init__(directory, max_bytes, compute_spectrogram, f"{fft_size}|{hop_size}", workers)
+        self.fft_size = fft_size
+        self.hop_size = hop_size
+
+    def request(self, filepath: str, bands: int, scale: str, pooling: str):
+        """the filterbank is rebuilt in the worker for the file's own sample rate"""
+        params = f"{bands}|{scale}|{pooling}"
+        super().request(filepath, self.fft_size, self.hop_size, bands, scale, pooling, params=params)
+
+    def get(self, filepath: str, bands: int, scale: str, pooling: str) -> Spectrogram | None:
+        entry = super().get(filepath, f"{bands}|{scale}|{pooling}")
+        if entry is None:
+            return None
+        rows, meta = entry
+        return Spectrogram(rows, meta["hop_size"])
@@ -0,0 +1,195 @@
+import os, time, json, threading, numpy as np
+
+# PortAudio callback status flags, as PyAudio passes them
+INPUT_UNDERFLOW = 1
+INPUT_OVERFLOW = 2
+OUTPUT_UNDERFLOW = 4
+OUTPUT_OVERFLOW = 8
+PRIMING_OUTPUT = 16
+STATUS_FLAGS = {
+    "input_underflow": INPUT_UNDERFLOW,
+    "input_overflow": INPUT_OVERFLOW,
+    "output_underflow": OUTPUT_UNDERFLOW,
+    "output_overflow": OUTPUT_OVERFLOW,
+    "priming_output": PRIMING_OUTPUT,
+}
+
+
+class CallbackTelemetry:
+    """Single producer / single consumer ring of per-callback records, preallocated column by column.
+
+    The audio thread only stores a handful of scalars and moves write_count, the aggregator only moves
+    read_count, same as utilities.RingBuffer. When the reader falls a whole ring behind the oldest
+    records are overwritten and counted as lost instead of blocking the callback."""
+
+    # what the callback returned
+    AUDIO = 0
+    PAUSED = 1  # silence while paused or scrubbing the timeline
+    LOCKED = 2  # silence because seeking_lock was held by a seek
+    FINISHED = 3
+    EVENTS = ("audio", "paused", "locked", "finished")
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.start = np.zeros(capacity)  # perf_counter when the callback began
+        self.duration = np.zeros(capacity)
+        self.dac_time = np.zeros(capacity)  # PortAudio time the block reaches the DAC, 0 if unknown
+        self.frames = np.zeros(capacity, dtype=np.int32)
+        self.status = np.zeros(capacity, dtype=np.int32)
+        self.event = np.zeros(capacity, dtype=np.int8)
+        self.buffered = np.zeros(capacity, dtype=np.int64)  # read-ahead frames left, -1 playing from the PCM cache
+        self.write_count = 0
+        self.read_count = 0
+
+    def record(self, start: float, duration: float, frames: int, status: int, time_info, event: int, buffered: int):
+        """audio thread"""
+        i = self.write_count % self.capacity
+        self.start[i] = start
+        self.duration[i] = duration
+        self.dac_time[i] = time_info["output_buffer_dac_time"] if time_info else 0.0
+        self.frames[i] = frames
+        self.status[i] = status or 0
+        self.event[i] = event
+        self.buffered[i] = buffered
+        self.write_count += 1
+
+    def drain(self):
+        """consumer side: (indexes of the unread records oldest first, records lost to overwriting)"""
+        end = self.write_count
+        lost = max(end - self.read_count - self.capacity, 0)
+        start = self.read_count + lost
+        self.read_count = end
+        return np.arange(start, end) % self.capacity, lost
+
+
+class TelemetryAggregator:
+    """Non-realtime side: every `interval` seconds drains the callback ring into histograms and counters.
+
+    Durations and DAC time jitter (deviation of the DAC time step from the buffer period) go into
+    log-spaced histograms from 10 us to 1 s. Totals since start are kept for get_summary(), and with an
+    export path each interval is appended as one JSON line stamped with perf_counter, the clock the frame
+    profiler dump uses, so dropouts can be lined up with UI load."""
+
+    bins = np.concatenate(([0], np.geomspace(1e-5, 1, 26), [np.inf]))
+
+    def __init__(self, telemetry: CallbackTelemetry, sample_rate_of, interval: float = 1.0, path: str = None) -> None:
+        """sample_rate_of() returns the playing track's rate, for the buffer period"""
+        self.telemetry = telemetry
+        self.sample_rate_of = sample_rate_of
+        self.interval = interval
+        self.path = path
+        self.file = None
+        self.last_dac_time = None
+        self.totals = self.empty_window()
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def empty_window(self) -> dict:
+        return {
+            "callbacks": 0,
+            "lost": 0,
+            "duration_hist": np.zeros(len(self.bins) - 1, dtype=np.int64),
+            "jitter_hist": np.zeros(len(self.bins) - 1, dtype=np.int64),
+            "duration_max": 0.0,
+            "jitter_max": 0.0,
+            "late": 0,  # callbacks that took longer than their buffer period
+            "events": dict.fromkeys(CallbackTelemetry.EVENTS, 0),
+            "status": dict.fromkeys(STATUS_FLAGS, 0),
+            "buffered_min": None,
+        }
+
+    def start(self):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "a")
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.collect()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            self.collect()
+
+    def collect(self):
+        indexes, lost = self.telemetry.drain()
+        if len(indexes) == 0 and lost == 0:
+            return
+        window = self.aggregate(indexes, lost)
+        with self.lock:
+            self.merge(self.totals, window)
+        if self.file is not None:
+            record = {"time": time.time(), "perf_counter": time.perf_counter(), **self.to_json(window)}
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def aggregate(self, indexes: np.ndarray, lost: int) -> dict:
+        t = self.telemetry
+        window = self.empty_window()
+        window["callbacks"] = len(indexes)
+        window["lost"] = lost
+        duration = t.duration[indexes]
+        frames = t.frames[indexes]
+        window["duration_hist"] += np.histogram(duration, self.bins)[0]
+        window["duration_max"] = float(duration.max(initial=0))
+        period = frames / max(self.sample_rate_of(), 1)
+        window["late"] = int((duration > period).sum())
+
+        # jitter of consecutive DAC times, only where the host reports them
+        dac = t.dac_time[indexes]
+        known = dac > 0
+        dac, period = dac[known], period[known]
+        if len(dac):
+            previous = np.concatenate(([self.last_dac_time if self.last_dac_time is not None else dac[0]], dac[:-1]))
+            jitter = np.abs(dac - previous - period)
+            jitter[0] = 0 if self.last_dac_time is None else jitter[0]
+            window["jitter_hist"] += np.histogram(jitter, self.bins)[0]
+            window["jitter_max"] = float(jitter.max())
+            self.last_dac_time = dac[-1]
+
+        counts = np.bincount(t.event[indexes], minlength=len(CallbackTelemetry.EVENTS))
+        window["events"] = {name: int(counts[i]) for i, name in enumerate(CallbackTelemetry.EVENTS)}
+        status = t.status[indexes]
+        window["status"] = {name: int((status & flag != 0).sum()) for name, flag in STATUS_FLAGS.items()}
+        buffered = t.buffered[indexes]
+        buffered = buffered[buffered >= 0]
+        window["buffered_min"] = int(buffered.min()) if len(buffered) else None
+        return window
+
+    def merge(self, totals: dict, window: dict):
+        for key in ("callbacks", "lost", "late", "duration_hist", "jitter_hist"):
+            totals[key] += window[key]
+        totals["duration_max"] = max(totals["duration_max"], window["duration_max"])
+        totals["jitter_max"] = max(totals["jitter_max"], window["jitter_max"])
+        for group in ("events", "status"):
+            for name, count in window[group].items():
+                totals[group][name] += count
+        if window["buffered_min"] is not None:
+            current = totals["buffered_min"]
+            totals["buffered_min"] = window["buffered_min"] if current is None else min(current, window["buffered_min"])
+
+    def to_json(self, window: dict) -> dict:
+        record = dict(window)
+        record["duration_hist"] = window["duration_hist"].tolist()
+        record["jitter_hist"] = window["jitter_hist"].tolist()
+        record["events"] = dict(window["events"])
+        record["status"] = dict(window["status"])
+        return record
+
+    def get_summary(self) -> dict:
+        """totals since start, histogram upper bin edges in seconds under "bins" """
+        with self.lock:
+            summary = self.to_json(self.totals)
+        summary["bins"] = self.bins[1:].tolist()
+        return summary
@@ -1,6 +1,8 @@
 import pygame, pygame.gfxdraw
 from dataclasses import dataclass
 from copy import deepcopy
+from utilities.TextCache import text_cache
+from utilities.ScaleCache import scale_cache
 
 
 @dataclass
@@ -119,14 +121,15 @@ class ToggleButtons(Buttons):
         super().__init__(template, size, pos, sc_size, Next)
         self.resize(image_list, sc_size, key=current_key)
 
-    def resize(self, image_list, sc_size: tuple, key):
+    def resize(self, image_list, sc_size: tuple, key, smooth: bool = True):
+        """smooth=False scales the icons nearest neighbour, for sizes only shown while dragging the window"""
         super().set_size(sc_size)
         target_size = (sc_size[1] * self.size[1] * self.scale, sc_size[1] * self.size[1] * self.scale)
         for k in self.keys:
             original_size = image_list[k].get_size()
             scaling_factor = min(target_size[0] / original_size[0], target_size[1] / original_size[1])
-            self.image_list[k] = pygame.transform.smoothscale(
-                image_list[k], (original_size[0] * scaling_factor, original_size[1] * scaling_factor)
+            self.image_list[k] = scale_cache.scale(
+                image_list[k], (original_size[0] * scaling_factor, original_size[1] * scaling_factor), smooth
             )
         if key is None:
             self.current_image = self.image_list[self.keys[-1]]
@@ -150,7 +153,7 @@ class TextButtons(Buttons):
 
     def resize(self, sc_size: tuple, font: pygame.font.Font):
         super().set_size(sc_size)
-        self.tex_surf = font.render(self.text, True, self.template.text_color)
+        self.tex_surf = text_cache.render(font, self.text, self.template.text_color)
         self.text_rect = self.tex_surf.get_rect(center=self.rectangle.center)
 
     def draw(self, surface: pygame.Surface):
@@ -1,5 +1,6 @@
 import pygame, pygame.gfxdraw
 from utilities.Buttons import TextButtons, Arrow, ButtonTemplate, DefaultTemplate
+from utilities.TextCache import text_cache
 
 
 class Carousel:
@@ -55,7 +56,7 @@ class Carousel:
                 ),
             )
             if self.title_text is not None:
-                self.rendered_title = self.font.render(self.title_text, True, self.template.text_color)
+                self.rendered_title = text_cache.render(self.font, self.title_text, self.template.text_color)
                 self.title_rect = self.rendered_title.get_rect(
                     centery=self.bounding_rect.centery, right=self.bounding_rect.left - 40
                 )
@@ -69,7 +70,7 @@ class Carousel:
         self.InitArrows(sc_size[0], sc_size[1], font)
 
     def update_text(self):
-        self.rendered_text = self.font.render(self.list[self.current_index], True, self.template.text_color)
+        self.rendered_text = text_cache.render(self.font, self.list[self.current_index], self.template.text_color)
         self.text_rect = self.rendered_text.get_rect(center=self.bounding_rect.center)
 
     def draw(self, surface: pygame.Surface):
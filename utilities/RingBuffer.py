@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Single producer / single consumer ring of PCM frames.
+
+    Only the producer moves write_count and only the consumer moves read_count, so neither side
+    needs a lock. Both counters grow forever and are wrapped with a modulo when indexing."""
+
+    def __init__(self, capacity: int, channels: int = 1, dtype: str = "int16") -> None:
+        self.capacity = capacity
+        self.channels = channels
+        self.buffer = np.zeros((capacity, channels), dtype=dtype)
+        self.write_count = 0
+        self.read_count = 0
+        self.dropped = 0
+
+    def available_read(self) -> int:
+        return self.write_count - self.read_count
+
+    def available_write(self) -> int:
+        return self.capacity - (self.write_count - self.read_count)
+
+    def write(self, data: np.ndarray) -> int:
+        """producer side; frames that do not fit are dropped and counted, never blocks"""
+        n = min(len(data), self.available_write())
+        if n < len(data):
+            self.dropped += len(data) - n
+        start = self.write_count % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start : start + first] = data[:first]
+        self.buffer[: n - first] = data[first:n]
+        self.write_count += n
+        return n
+
+    def read(self, out: np.ndarray, frames: int = None) -> int:
+        """consumer side; copies up to frames (default len(out)) into out and returns the number copied"""
+        frames = len(out) if frames is None else frames
+        n = min(frames, self.available_read())
+        start = self.read_count % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start : start + first]
+        out[first:n] = self.buffer[: n - first]
+        self.read_count += n
+        return n
+
+    def skip(self, frames: int) -> int:
+        """consumer side; discards up to frames without copying them"""
+        n = min(frames, self.available_read())
+        self.read_count += n
+        return n
+
+    def clear(self):
+        """consumer side; drops everything currently buffered"""
+        self.read_count = self.write_count
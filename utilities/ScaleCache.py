@@ -0,0 +1,45 @@
+import pygame
+from collections import OrderedDict
+
+
+class ScaleCache:
+    """LRU of scaled copies of long lived surfaces (icons, covers) keyed by (surface, size, smooth).
+
+    Sizes are bucketed to whole pixels the way pygame truncates them, so every window size mapping to
+    the same icon size shares one entry and resizing back to a size seen before scales nothing. A fast
+    nearest neighbour request is served by the smooth copy when there already is one. The surfaces
+    are shared: copy them before drawing on them."""
+
+    def __init__(self, capacity: int = 48) -> None:
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> pygame.Surface | None:
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+        return surface
+
+    def scale(self, surface: pygame.Surface, size: tuple, smooth: bool = True) -> pygame.Surface:
+        size = (max(int(size[0]), 1), max(int(size[1]), 1))
+        scaled = self.get((surface, size, True))
+        if scaled is None and not smooth:
+            scaled = self.get((surface, size, False))
+        if scaled is not None:
+            return scaled
+        self.misses += 1
+        scaled = pygame.transform.smoothscale(surface, size) if smooth else pygame.transform.scale(surface, size)
+        self.surfaces[(surface, size, smooth)] = scaled
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return scaled
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# shared by the buttons, the placeholder and the cover preview
+scale_cache = ScaleCache()
@@ -1,5 +1,6 @@
 import pygame
 from utilities.Buttons import Buttons, ButtonTemplate, DefaultTemplate
+from utilities.TextCache import text_cache
 import utilities.functions as func
 
 
@@ -149,7 +150,7 @@ class ValueSlider(Slider):
         self.resize(sc_size, font)  # Pass the font argument here
 
     def resize(self, sc_size, font: pygame.font.Font):
-        self.rendered_text = font.render(self.text, True, self.template.text_color)
+        self.rendered_text = text_cache.render(font, self.text, self.template.text_color)
         self.font = font
         super().set_size(sc_size)
         self.text_position = (
@@ -159,7 +160,7 @@ class ValueSlider(Slider):
 
     def draw(self, surface: pygame.Surface):
         super().draw(surface)
-        output = self.font.render(str(self.output), self.template.text_color, True)
+        output = text_cache.render(self.font, str(self.output), self.template.text_color)
         cy = output.get_rect(center=self.rectangle_bar.center).y
         surface.blit(
             output,
@@ -172,6 +173,8 @@ class ValueSlider(Slider):
 
 
 class TimeSlider(Slider):
+    waveform_sizes = 4  # rendered waveform sizes kept, so resizing back to one of them draws nothing
+
     def __init__(
         self,
         template: ButtonTemplate,
@@ -187,12 +190,50 @@ class TimeSlider(Slider):
         self.range = time_range
         self.output = 0 if self.range is None else self.range[0]
         self.format_function = format_function
+        self.waveform = None
+        self.waveform_surfs = None
+        self.waveform_renders = {}  # bar size -> surfs of the current waveform
         self.resize(sc_size, font)
 
-    def resize(self, sc_size, font: pygame.font.Font):
+    def resize(self, sc_size, font: pygame.font.Font, smooth: bool = True):
+        """smooth=False stretches the waveform already drawn instead of drawing it again column by column"""
         self.font = font
         super().set_size(sc_size)
         self.set_range(self.range)
+        size = self.rectangle_bar.size
+        if smooth or self.waveform_surfs is None or size in self.waveform_renders:
+            self.render_waveform()
+        else:
+            self.waveform_surfs = [pygame.transform.scale(surf, size) for surf in self.waveform_surfs]
+
+    def set_waveform(self, waveform):
+        """waveform is a PeakPyramid or None; it is rendered once per width, never per frame"""
+        self.waveform = waveform
+        self.waveform_renders.clear()
+        self.render_waveform()
+
+    def render_waveform(self):
+        if self.waveform is None:
+            self.waveform_surfs = None
+            return
+        width, height = self.rectangle_bar.size
+        self.waveform_surfs = self.waveform_renders.pop((width, height), None)
+        if self.waveform_surfs is not None:
+            self.waveform_renders[(width, height)] = self.waveform_surfs
+            return
+        mins, maxs, rms = self.waveform.columns(width)
+        mid = height / 2
+        self.waveform_surfs = []
+        for color in (self.template.slider_bar_color, self.template.bg_color):
+            rms_color = func.color_interpolation(color, (255, 255, 255), 0.35)
+            surf = pygame.Surface((width, height), pygame.SRCALPHA)
+            for x in range(width):
+                pygame.draw.line(surf, color, (x, mid - maxs[x] * mid), (x, mid - mins[x] * mid))
+                pygame.draw.line(surf, rms_color, (x, mid - rms[x] * mid), (x, mid + rms[x] * mid))
+            self.waveform_surfs.append(surf)
+        self.waveform_renders[(width, height)] = self.waveform_surfs
+        if len(self.waveform_renders) > TimeSlider.waveform_sizes:
+            del self.waveform_renders[next(iter(self.waveform_renders))]
 
     def set_range(self, time_range: tuple | list):
         self.range = time_range
@@ -207,19 +248,24 @@ class TimeSlider(Slider):
             self.button_outline.centerx = self.button_rect.centerx
 
     def draw(self, surface: pygame.Surface):
-        pygame.draw.rect(
-            surface,
-            self.template.bg_color,
-            (
-                self.rectangle_bar.left,
-                self.rectangle_bar.top,
-                self.button_rect.x - self.rectangle_bar.x,
-                self.rectangle_bar.height,
-            ),
-        )
+        played = self.button_rect.x - self.rectangle_bar.x
+        if self.waveform_surfs is not None:
+            surface.blit(self.waveform_surfs[0], self.rectangle_bar.topleft)
+            surface.blit(self.waveform_surfs[1], self.rectangle_bar.topleft, (0, 0, played, self.rectangle_bar.height))
+        else:
+            pygame.draw.rect(
+                surface,
+                self.template.bg_color,
+                (
+                    self.rectangle_bar.left,
+                    self.rectangle_bar.top,
+                    played,
+                    self.rectangle_bar.height,
+                ),
+            )
         super().draw(surface)
-        max_time = self.font.render(self.format_function(self.range[-1]), True, color=self.template.text_color)
-        elapsed_time = self.font.render(self.format_function(self.output), True, color=self.template.text_color)
+        max_time = text_cache.render(self.font, self.format_function(self.range[-1]), self.template.text_color)
+        elapsed_time = text_cache.render(self.font, self.format_function(self.output), self.template.text_color)
 
         max_time_rect = max_time.get_rect(center=self.rectangle_bar.center)
         elapsed_time_rect = elapsed_time.get_rect(center=self.rectangle_bar.center)
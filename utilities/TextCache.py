@@ -0,0 +1,104 @@
+import pygame
+from collections import OrderedDict
+
+
+class TextCache:
+    """LRU of rendered text keyed by (font, text, color, antialias).
+
+    Fonts are keyed by identity, so text rendered with a font that is still around stays valid; forget()
+    drops the entries of a font being thrown away instead of letting them age out. The surfaces are
+    shared: blit them, don't draw on them."""
+
+    def __init__(self, capacity: int = 256) -> None:
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font: pygame.font.Font, text: str, color, antialias: bool = True) -> pygame.Surface:
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def forget(self, font: pygame.font.Font):
+        """drops what was rendered with a font that is going away"""
+        for key in [key for key in self.surfaces if key[0] is font]:
+            del self.surfaces[key]
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# shared by every widget; a font's entries are forgotten when it falls out of the application's font cache
+# (gp.font_cache_size sizes), the rest only age out of the LRU
+text_cache = TextCache()
+
+
+class Marquee:
+    """One line of text that scrolls inside a fixed width when it does not fit.
+
+    The text is rendered once through the cache; scrolling only moves the area blitted out of that
+    surface, with a second copy following `gap` pixels behind so the loop is seamless. Every cycle
+    holds the start of the text for `pause` seconds."""
+
+    gap = 40
+
+    def __init__(self, speed: float = 40, pause: float = 1.5) -> None:
+        """speed in pixels per second"""
+        self.speed = speed
+        self.pause = pause
+        self.key = None
+        self.surface = None
+        self.offset = 0.0
+        self.hold = pause
+
+    def set_text(self, font: pygame.font.Font, text: str, color):
+        key = (font, text, tuple(color))
+        if key == self.key:
+            return
+        # a new font only rescales the text, a new text starts over
+        if self.key is None or self.key[1] != text:
+            self.offset = 0.0
+            self.hold = self.pause
+        self.key = key
+        self.surface = text_cache.render(font, text or "", color)
+
+    def scrolling(self, width: int) -> bool:
+        return self.surface is not None and self.surface.get_width() > width
+
+    def update(self, dt: float, width: int):
+        if not self.scrolling(width):
+            self.offset = 0.0
+            return
+        if self.hold > 0:
+            self.hold -= dt
+            return
+        cycle = self.surface.get_width() + Marquee.gap
+        self.offset += self.speed * dt
+        if self.offset >= cycle:
+            self.offset = 0.0
+            self.hold = self.pause
+
+    def position(self) -> int:
+        """pixel offset actually drawn, changes only when the blitted image does"""
+        return int(self.offset)
+
+    def draw(self, surface: pygame.Surface, pos: tuple, width: int):
+        if self.surface is None:
+            return
+        width = int(width)
+        offset = self.position()
+        height = self.surface.get_height()
+        surface.blit(self.surface, pos, (offset, 0, width, height))
+        follower = self.surface.get_width() + Marquee.gap - offset
+        if offset and follower < width:
+            surface.blit(self.surface, (pos[0] + follower, pos[1]), (0, 0, width - follower, height))
@@ -0,0 +1,91 @@
+import os, numpy as np, soundfile as sf, globals as gp
+from diskcache import MemmapCache, write_meta
+
+
+def combine_level(level: np.ndarray) -> np.ndarray:
+    """halves a (bins, 3) min/max/rms level by merging neighbouring bins"""
+    if len(level) % 2:
+        level = np.concatenate((level, level[-1:]))
+    pairs = level.reshape(-1, 2, 3).astype(np.float64)
+    out = np.empty((len(pairs), 3), dtype=np.int16)
+    out[:, 0] = pairs[:, :, 0].min(axis=1)
+    out[:, 1] = pairs[:, :, 1].max(axis=1)
+    out[:, 2] = np.sqrt((pairs[:, :, 2] ** 2).mean(axis=1))
+    return out
+
+
+def compute_peaks(filepath: str, path: str, base: int = gp.waveform_base_decimation, chunk_bins: int = 1024):
+    """runs in a worker process: streams the track in chunks into min/max/rms bins of `base` frames,
+    then builds every power-of-two coarser level from the previous one"""
+    bins = []
+    with sf.SoundFile(filepath) as file:
+        for block in file.blocks(blocksize=base * chunk_bins, dtype=gp.dtype, always_2d=True):
+            n = -(-len(block) // base)
+            padded = np.zeros((n * base, block.shape[1]), dtype=np.float32)
+            padded[: len(block)] = block
+            padded = padded.reshape(n, -1)
+            level = np.empty((n, 3), dtype=np.int16)
+            level[:, 0] = padded.min(axis=1)
+            level[:, 1] = padded.max(axis=1)
+            level[:, 2] = np.minimum(np.sqrt((padded**2).mean(axis=1)), 2**15 - 1)
+            bins.append(level)
+    levels = [np.concatenate(bins) if bins else np.zeros((1, 3), dtype=np.int16)]
+    while len(levels[-1]) > 1:
+        levels.append(combine_level(levels[-1]))
+
+    pyramid = np.concatenate(levels)
+    tmp_path = path + ".tmp"
+    pyramid.tofile(tmp_path)
+    os.replace(tmp_path, path)
+    offsets = np.cumsum([0] + [len(level) for level in levels])
+    write_meta(
+        path,
+        shape=list(pyramid.shape),
+        base=base,
+        levels=[[int(offsets[i]), len(level)] for i, level in enumerate(levels)],
+    )
+    return path
+
+
+class PeakPyramid:
+    """min/max/rms overview of a track at power-of-two decimation levels; any width is served from the
+    coarsest level that still has at least one bin per column, so a lookup is O(width)"""
+
+    def __init__(self, data: np.ndarray, levels: list) -> None:
+        self.data = data
+        self.levels = levels
+        top = data[levels[-1][0]]
+        self.peak = max(abs(int(top[0])), abs(int(top[1])), 1)
+
+    def level_for(self, width: int) -> np.ndarray:
+        for offset, length in reversed(self.levels):
+            if length >= width:
+                return self.data[offset : offset + length]
+        offset, length = self.levels[0]
+        return self.data[offset : offset + length]
+
+    def columns(self, width: int):
+        """(mins, maxs, rms) of `width` columns, normalised to -1..1 by the track's peak"""
+        level = self.level_for(width)
+        starts = np.linspace(0, len(level), width, endpoint=False).astype(np.intp)
+        mins = np.minimum.reduceat(level[:, 0], starts) / self.peak
+        maxs = np.maximum.reduceat(level[:, 1], starts) / self.peak
+        rms = np.maximum.reduceat(level[:, 2], starts) / self.peak
+        return (mins, maxs, rms)
+
+
+class PeakCache(MemmapCache):
+    """waveform pyramids of upcoming tracks, kept on disk next to the other per-track caches"""
+
+    suffix = ".peaks"
+    dtype = np.int16
+
+    def __init__(self, directory: str, max_bytes: int, workers: int = 1) -> None:
+        super().__init__(directory, max_bytes, compute_peaks, str(gp.waveform_base_decimation), workers)
+
+    def get(self, filepath: str) -> PeakPyramid | None:
+        entry = super().get(filepath)
+        if entry is None:
+            return None
+        data, meta = entry
+        return PeakPyramid(data, meta["levels"])